@@ -1,7 +1,23 @@
 import reflex as rx
-from app.state import PoetryState
-from app.components import poetry_grid, filter_controls, preamble_card, app_footer
+from app.state import PoemContentState, PoetryState, delta_metrics_lifespan
+from app.components import (
+    poem_list,
+    filter_controls,
+    preamble_card,
+    app_footer,
+    poem_stanza,
+    poem_image,
+)
+from app.catalog import catalog_lifespan
+from app.client_search import CLIENT_SEARCH_ENABLED, client_search_routes
+from app.export import export_lifespan
+from app.images import image_route, images_lifespan
+from app.metrics import METRICS_ENABLED, metrics_route
+from app.notion import notion_lifespan
+from app.prefetch import prefetch_lifespan
+from app.search import search_lifespan
 import asyncio
+from starlette.applications import Starlette
 
 
 def poem_detail_page() -> rx.Component:
@@ -9,13 +25,10 @@ def poem_detail_page() -> rx.Component:
     return rx.el.div(
         rx.el.div(class_name="vignette-overlay pointer-events-none"),
         rx.el.main(
+            # Shown by assets/ui_signals.js while the reader is idle.
             rx.el.p(
                 "be still.",
-                class_name=rx.cond(
-                    PoetryState.idle,
-                    "fixed inset-0 flex items-center justify-center text-2xl font-['Fraunces'] text-white/30 z-50 transition-opacity duration-1000 opacity-100",
-                    "fixed inset-0 flex items-center justify-center text-2xl font-['Fraunces'] text-white/30 z-50 transition-opacity duration-1000 opacity-0 pointer-events-none",
-                ),
+                class_name="idle-message fixed inset-0 flex items-center justify-center text-2xl font-['Fraunces'] text-white/30 z-50 transition-opacity duration-1000 opacity-0 pointer-events-none",
             ),
             rx.el.div(
                 rx.el.div(
@@ -80,10 +93,7 @@ def poem_detail_page() -> rx.Component:
                                 rx.el.div(class_name="h-12"),
                                 rx.cond(
                                     PoetryState.selected_poem["image_url"],
-                                    rx.image(
-                                        src=PoetryState.selected_poem["image_url"],
-                                        class_name="w-full h-64 object-cover rounded-xl mb-8 shadow-lg shadow-black/20",
-                                    ),
+                                    poem_image(PoetryState.selected_poem["image_url"]),
                                 ),
                                 rx.el.h1(
                                     PoetryState.selected_poem["title"],
@@ -96,8 +106,10 @@ def poem_detail_page() -> rx.Component:
                                     PoetryState.selected_poem["date"],
                                     class_name="opacity-100 transition-opacity text-md text-gray-500 mb-12 font-['Inter']",
                                 ),
-                                rx.el.pre(
-                                    PoetryState.poem_text_full,
+                                rx.el.div(
+                                    rx.foreach(
+                                        PoemContentState.poem_stanzas, poem_stanza
+                                    ),
                                     class_name="text-xl text-[#F3F1EE]/80 font-['Inter'] whitespace-pre-wrap poem-fade-in",
                                     style={"lineHeight": 1.8},
                                 ),
@@ -115,10 +127,10 @@ def poem_detail_page() -> rx.Component:
                         rx.icon("arrow-left", size=16, class_name="mr-2"),
                         rx.el.span("Previous: "),
                         rx.el.span(
-                            PoetryState.prev_poem["title"],
+                            PoetryState.prev_poem[1],
                             class_name="font-['Fraunces']",
                         ),
-                        href=f"/poem/{PoetryState.prev_poem['id']}",
+                        href=f"/poem/{PoetryState.prev_poem[0]}",
                         class_name="flex items-center text-gray-400 hover:text-[#B7926F] transition-colors duration-300",
                     ),
                     rx.el.div(),
@@ -131,12 +143,12 @@ def poem_detail_page() -> rx.Component:
                     PoetryState.next_poem,
                     rx.el.a(
                         rx.el.span(
-                            PoetryState.next_poem["title"],
+                            PoetryState.next_poem[1],
                             class_name="font-['Fraunces']",
                         ),
                         rx.el.span(" :Next"),
                         rx.icon("arrow-right", size=16, class_name="ml-2"),
-                        href=f"/poem/{PoetryState.next_poem['id']}",
+                        href=f"/poem/{PoetryState.next_poem[0]}",
                         class_name="flex items-center text-gray-400 hover:text-[#B7926F] transition-colors duration-300",
                     ),
                     rx.el.div(),
@@ -146,11 +158,6 @@ def poem_detail_page() -> rx.Component:
             app_footer(),
             class_name="w-full min-h-screen flex flex-col items-center justify-start pt-24 p-4 sm:p-6 md:p-8",
         ),
-        on_mount=[
-            rx.call_script(
-                "(function() { let timeout; function resetTimer() { clearTimeout(timeout); timeout = setTimeout(() => { E_PoetryState.handle_idle(); }, 30000); } document.onmousemove = resetTimer; document.onkeypress = resetTimer; resetTimer(); })()"
-            )
-        ],
         class_name="min-h-screen text-[#F3F1EE] poem-detail-crossfade poetic-gradient",
     )
 
@@ -180,20 +187,12 @@ def index() -> rx.Component:
                 rx.cond(
                     PoetryState.preamble_poem, preamble_card(PoetryState.preamble_poem)
                 ),
-                rx.el.div(filter_controls(), poetry_grid(), class_name="mt-16"),
+                rx.el.div(filter_controls(), poem_list(), class_name="mt-16"),
                 class_name="max-w-2xl mx-auto w-full px-4",
             ),
             app_footer(),
             class_name="min-h-screen text-[#F3F1EE] flex flex-col items-center pt-32 p-4 sm:p-6 md:py-24",
         ),
-        on_mount=[
-            rx.call_script(
-                "(function() { let timeout; function resetTimer() { clearTimeout(timeout); timeout = setTimeout(() => { E_PoetryState.handle_idle(); }, 30000); } document.onmousemove = resetTimer; document.onkeypress = resetTimer; resetTimer(); })()"
-            ),
-            rx.call_script(
-                "(function() { function checkScroll() { if ((window.innerHeight + window.scrollY) >= document.body.offsetHeight - 50) { E_PoetryState.at_bottom(); window.removeEventListener('scroll', checkScroll); } } window.addEventListener('scroll', checkScroll); })()"
-            ),
-        ],
         class_name="poetic-gradient",
     )
 
@@ -207,10 +206,30 @@ app = rx.App(
             href="https://fonts.googleapis.com/css2?family=Fraunces:ital,opsz,wght@0,9..144,400;0,9..144,700;1,9..144,400;1,9..144,700&family=Inter:ital,wght@0,300;0,400;0,500;1,400&display=swap",
             rel="stylesheet",
         ),
+        rx.el.script(src="/ui_signals.js", defer=True),
+        rx.el.script(src="/poem_window.js", defer=True),
+        *(
+            [rx.el.script(src="/client_search.js", defer=True)]
+            if CLIENT_SEARCH_ENABLED
+            else []
+        ),
     ],
     stylesheets=["/style.css"],
+    api_transformer=Starlette(
+        routes=[image_route, metrics_route, *client_search_routes]
+    ),
 )
+app.register_lifespan_task(notion_lifespan)
+app.register_lifespan_task(catalog_lifespan)
+app.register_lifespan_task(prefetch_lifespan)
+app.register_lifespan_task(images_lifespan)
+app.register_lifespan_task(export_lifespan)
+app.register_lifespan_task(search_lifespan)
+if METRICS_ENABLED:
+    app.register_lifespan_task(delta_metrics_lifespan, reflex_app=app)
 app.add_page(index, on_load=PoetryState.fetch_poems)
 app.add_page(
-    poem_detail_page, route="/poem/[poem_id]", on_load=PoetryState.fetch_poem_content
+    poem_detail_page,
+    route="/poem/[poem_id]",
+    on_load=PoemContentState.fetch_poem_content,
 )
\ No newline at end of file
@@ -0,0 +1,506 @@
+"""Shared storage for the catalog and poem bodies, and leases between workers.
+
+Every backend worker reads and writes the same backend, so a catalog or
+body fetched by one is served by all of them. By default that is a SQLite
+file, which works for workers on one machine; set POETRY_CACHE_URL to a
+redis:// URL to share it between machines.
+"""
+
+import abc
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Iterator, Optional
+from urllib.parse import unquote, urlparse
+
+from app.models import Poem, Stanza
+
+SNAPSHOT_PATH = os.getenv("POETRY_SNAPSHOT_PATH", ".data/poetry.sqlite3")
+CACHE_URL = os.getenv("POETRY_CACHE_URL", "")
+CACHE_PREFIX = os.getenv("POETRY_CACHE_PREFIX", "poetry:")
+LEASE_TTL_SECONDS = float(os.getenv("POETRY_LEASE_TTL", "30"))
+
+# Identifies this process as a lease holder.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class CacheBackend(abc.ABC):
+    """Stores the last good catalog and every fetched body, plus named leases.
+
+    All methods are blocking; call them through asyncio.to_thread from
+    event handlers. Failures are logged and treated as a cache miss (or,
+    for leases, as not holding the lease), since Notion is the source of
+    truth.
+    """
+
+    @abc.abstractmethod
+    def load_catalog(self) -> Optional[list[Poem]]:
+        """Returns the saved catalog, if there is one."""
+
+    @abc.abstractmethod
+    def catalog_info(self) -> Optional[tuple[str, float]]:
+        """Returns the saved catalog's version and save time, without reading it."""
+
+    @abc.abstractmethod
+    def save_catalog(self, version: str, poems: list[Poem]):
+        """Replaces the saved catalog with `poems`, tagged with its version."""
+
+    @abc.abstractmethod
+    def touch_catalog(self, version: str):
+        """Marks the saved catalog as just refreshed, if it is still `version`."""
+
+    @abc.abstractmethod
+    def load_body(self, poem_id: str, edited: str) -> Optional[list[Stanza]]:
+        """Returns a saved body, if it was saved for this exact edit time."""
+
+    @abc.abstractmethod
+    def load_bodies(self) -> dict[str, tuple[str, list[Stanza]]]:
+        """Returns every saved body as {poem_id: (edited, content)}."""
+
+    @abc.abstractmethod
+    def body_versions(self) -> dict[str, str]:
+        """Returns the edit time of every saved body, without reading the bodies."""
+
+    @abc.abstractmethod
+    def save_body(self, poem_id: str, edited: str, content: list[Stanza]):
+        """Saves a body, replacing any saved for an earlier edit."""
+
+    @abc.abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes or renews a lease unless another owner holds it unexpired."""
+
+    @abc.abstractmethod
+    def release_lease(self, name: str, owner: str):
+        """Gives up a lease, if this owner still holds it."""
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    poems TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bodies (
+    poem_id TEXT PRIMARY KEY,
+    edited TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteBackend(CacheBackend):
+    """Keeps everything in one SQLite file, shared by workers on this machine."""
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self._initialized = False
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load_catalog(self) -> Optional[list[Poem]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT poems FROM catalog WHERE id = 1").fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to load catalog snapshot: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def catalog_info(self) -> Optional[tuple[str, float]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT version, saved_at FROM catalog WHERE id = 1"
+                ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to read catalog version: {e}")
+            return None
+        return (row[0], row[1]) if row else None
+
+    def save_catalog(self, version: str, poems: list[Poem]):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO catalog (id, version, saved_at, poems) "
+                    "VALUES (1, ?, ?, ?)",
+                    (version, time.time(), json.dumps(poems)),
+                )
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to save catalog snapshot: {e}")
+
+    def touch_catalog(self, version: str):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE catalog SET saved_at = ? WHERE id = 1 AND version = ?",
+                    (time.time(), version),
+                )
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to touch catalog snapshot: {e}")
+
+    def load_body(self, poem_id: str, edited: str) -> Optional[list[Stanza]]:
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content FROM bodies WHERE poem_id = ? AND edited = ?",
+                    (poem_id, edited),
+                ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to load body for {poem_id}: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def load_bodies(self) -> dict[str, tuple[str, list[Stanza]]]:
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT poem_id, edited, content FROM bodies"
+                ).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to load bodies: {e}")
+            return {}
+        return {
+            poem_id: (edited, json.loads(content)) for poem_id, edited, content in rows
+        }
+
+    def body_versions(self) -> dict[str, str]:
+        try:
+            with self._connect() as conn:
+                rows = conn.execute("SELECT poem_id, edited FROM bodies").fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to list bodies: {e}")
+            return {}
+        return dict(rows)
+
+    def save_body(self, poem_id: str, edited: str, content: list[Stanza]):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO bodies (poem_id, edited, content) "
+                    "VALUES (?, ?, ?)",
+                    (poem_id, edited, json.dumps(content)),
+                )
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to save body for {poem_id}: {e}")
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET "
+                    "owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                    (name, owner, now + ttl, now),
+                )
+                return cursor.rowcount == 1
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to acquire lease {name}: {e}")
+            return False
+
+    def release_lease(self, name: str, owner: str):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)
+                )
+        except (sqlite3.Error, OSError) as e:
+            logging.exception(f"Failed to release lease {name}: {e}")
+
+
+class RedisError(Exception):
+    """An error reply from the server, or a malformed response."""
+
+
+class RespClient:
+    """A minimal, blocking client for the Redis serialization protocol (RESP2).
+
+    One connection is shared by every thread and guarded by a lock; it is
+    reopened once if it turns out to have been dropped. Only what the cache
+    backend needs is implemented: commands in, replies out.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def execute(self, *args: Any) -> Any:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    return self._execute(args)
+                except RedisError:
+                    raise
+                except OSError:
+                    # The server may have closed an idle connection; retry once.
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _execute(self, args: tuple) -> Any:
+        if self._sock is None:
+            self._open()
+        self._send(args)
+        return self._read()
+
+    def _open(self):
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._reader = self._sock.makefile("rb")
+        if self.password is not None:
+            if self.username:
+                self._send(("AUTH", self.username, self.password))
+            else:
+                self._send(("AUTH", self.password))
+            self._read()
+        if self.db:
+            self._send(("SELECT", self.db))
+            self._read()
+
+    def _close(self):
+        if self._sock is not None:
+            with contextlib.suppress(OSError):
+                self._sock.close()
+        self._sock = None
+        self._reader = None
+
+    def _send(self, args: tuple):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+
+    def _read(self) -> Any:
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RedisError(f"Unexpected reply type {kind!r}")
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+# Take the lease if it's free or already ours, atomically.
+ACQUIRE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder == false or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend(CacheBackend):
+    """Keeps everything in Redis (or anything speaking its protocol).
+
+    Keys, under `prefix`: `catalog` (the poems) and `catalog:meta` (their
+    version and save time) strings, a
+    `bodies` hash of {poem_id: [edited, content]}, a `body-versions` hash of
+    {poem_id: edited}, and `lease:<name>` strings that expire on their own.
+    """
+
+    def __init__(self, url: str, prefix: str = CACHE_PREFIX):
+        self.client = RespClient(url)
+        self.prefix = prefix
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+    def load_catalog(self) -> Optional[list[Poem]]:
+        try:
+            payload = self.client.execute("GET", self._key("catalog"))
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to load catalog snapshot: {e}")
+            return None
+        return json.loads(payload) if payload else None
+
+    def catalog_info(self) -> Optional[tuple[str, float]]:
+        try:
+            payload = self.client.execute("GET", self._key("catalog:meta"))
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to read catalog version: {e}")
+            return None
+        return tuple(json.loads(payload)) if payload else None
+
+    def save_catalog(self, version: str, poems: list[Poem]):
+        try:
+            # Poems first, so a reader never sees a version without its poems.
+            self.client.execute("SET", self._key("catalog"), json.dumps(poems))
+            self._set_meta(version)
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to save catalog snapshot: {e}")
+
+    def touch_catalog(self, version: str):
+        try:
+            info = self.catalog_info()
+            if info is not None and info[0] == version:
+                self._set_meta(version)
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to touch catalog snapshot: {e}")
+
+    def _set_meta(self, version: str):
+        self.client.execute(
+            "SET", self._key("catalog:meta"), json.dumps([version, time.time()])
+        )
+
+    def load_body(self, poem_id: str, edited: str) -> Optional[list[Stanza]]:
+        try:
+            payload = self.client.execute("HGET", self._key("bodies"), poem_id)
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to load body for {poem_id}: {e}")
+            return None
+        if not payload:
+            return None
+        body_edited, content = json.loads(payload)
+        return content if body_edited == edited else None
+
+    def load_bodies(self) -> dict[str, tuple[str, list[Stanza]]]:
+        try:
+            reply = self.client.execute("HGETALL", self._key("bodies")) or []
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to load bodies: {e}")
+            return {}
+        return {
+            poem_id: tuple(json.loads(payload))
+            for poem_id, payload in zip(reply[::2], reply[1::2])
+        }
+
+    def body_versions(self) -> dict[str, str]:
+        try:
+            reply = self.client.execute("HGETALL", self._key("body-versions")) or []
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to list bodies: {e}")
+            return {}
+        return dict(zip(reply[::2], reply[1::2]))
+
+    def save_body(self, poem_id: str, edited: str, content: list[Stanza]):
+        try:
+            self.client.execute(
+                "HSET", self._key("bodies"), poem_id, json.dumps([edited, content])
+            )
+            self.client.execute("HSET", self._key("body-versions"), poem_id, edited)
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to save body for {poem_id}: {e}")
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        try:
+            return bool(
+                self.client.execute(
+                    "EVAL",
+                    ACQUIRE_SCRIPT,
+                    1,
+                    self._key(f"lease:{name}"),
+                    owner,
+                    int(ttl * 1000),
+                )
+            )
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to acquire lease {name}: {e}")
+            return False
+
+    def release_lease(self, name: str, owner: str):
+        try:
+            self.client.execute(
+                "EVAL", RELEASE_SCRIPT, 1, self._key(f"lease:{name}"), owner
+            )
+        except (RedisError, OSError) as e:
+            logging.exception(f"Failed to release lease {name}: {e}")
+
+
+def open_backend(url: str = CACHE_URL) -> CacheBackend:
+    """Returns the backend for a cache URL: redis://... or a SQLite file path."""
+    if url.startswith("rediss://"):
+        raise ValueError("TLS connections to Redis are not supported")
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    return SQLiteBackend(url or SNAPSHOT_PATH)
+
+
+cache_backend = open_backend()
+
+
+@contextlib.asynccontextmanager
+async def hold_lease(
+    backend: CacheBackend, name: str, ttl: float = LEASE_TTL_SECONDS
+) -> AsyncIterator[bool]:
+    """Tries to take a lease and keeps renewing it until the block exits.
+
+    Yields whether the lease was taken; if not, another worker holds it.
+    """
+    acquired = await asyncio.to_thread(backend.acquire_lease, name, WORKER_ID, ttl)
+    renewer = (
+        asyncio.create_task(_renew_lease(backend, name, ttl)) if acquired else None
+    )
+    try:
+        yield acquired
+    finally:
+        if renewer is not None:
+            renewer.cancel()
+            await asyncio.to_thread(backend.release_lease, name, WORKER_ID)
+
+
+async def _renew_lease(backend: CacheBackend, name: str, ttl: float):
+    while True:
+        await asyncio.sleep(ttl / 3)
+        if not await asyncio.to_thread(backend.acquire_lease, name, WORKER_ID, ttl):
+            logging.warning(f"Lost lease {name}; another worker may take over")
@@ -0,0 +1,133 @@
+"""Compiles Notion blocks into render-ready stanzas, once, when a body is read."""
+
+from typing import Any, Iterable, Iterator
+
+from app.models import Stanza
+
+VERSE_CLASS = "poem-verse"
+QUOTE_CLASS = "poem-quote"
+DIVIDER_CLASS = "poem-divider"
+HEADING_CLASSES = {
+    "heading_1": "poem-heading poem-heading-1",
+    "heading_2": "poem-heading poem-heading-2",
+    "heading_3": "poem-heading poem-heading-3",
+}
+ANNOTATIONS = ("bold", "italic", "strikethrough", "underline", "code")
+COLORS = ("gray", "brown", "orange", "yellow", "green", "blue", "purple", "pink", "red")
+
+Span = tuple[str, str, str]
+
+
+def span_class(part: dict[str, Any]) -> str:
+    """Returns the CSS classes for one rich-text part's annotations and link."""
+    annotations = part.get("annotations") or {}
+    classes = [f"poem-{name}" for name in ANNOTATIONS if annotations.get(name)]
+    color = annotations.get("color", "default")
+    background = color.removesuffix("_background")
+    if background != color and background in COLORS:
+        classes += ["poem-background", f"poem-background-{background}"]
+    elif color in COLORS:
+        classes.append(f"poem-color-{color}")
+    if part.get("href"):
+        classes.append("poem-link")
+    return " ".join(classes)
+
+
+def compile_rich_text(rich_text: list[dict[str, Any]]) -> list[list[Span]]:
+    """Turns rich text into lines of spans, breaking at its newlines."""
+    lines: list[list[Span]] = [[]]
+    for part in rich_text:
+        class_name = span_class(part)
+        href = part.get("href") or ""
+        for i, text in enumerate(part.get("plain_text", "").split("\n")):
+            if i:
+                lines.append([])
+            if text:
+                lines[-1].append((text, class_name, href))
+    return lines
+
+
+def is_blank(line: list[Span]) -> bool:
+    return not any(text.strip() for text, _, _ in line)
+
+
+def stanza(kind: str, class_name: str, lines: list[list[Span]]) -> Stanza:
+    return {"kind": kind, "class_name": class_name, "lines": lines}
+
+
+class StanzaCompiler:
+    """Builds stanzas from a poem's blocks, fed one page of blocks at a time.
+
+    Consecutive lines of text form a verse stanza, and a blank line ends it,
+    as it does in the Notion page. Headings, quotes and dividers are stanzas
+    of their own. Any other block with rich text is read as verse; blocks
+    without text are skipped.
+    """
+
+    def __init__(self):
+        self._stanzas: list[Stanza] = []
+        self._verse: list[list[Span]] = []
+
+    def feed(self, blocks: Iterable[dict[str, Any]]):
+        for block in blocks:
+            self._compile(block)
+
+    def _compile(self, block: dict[str, Any]):
+        kind = block.get("type", "")
+        payload = block.get(kind) or {}
+        if kind in HEADING_CLASSES:
+            self._close_verse()
+            lines = compile_rich_text(payload.get("rich_text", []))
+            self._stanzas.append(stanza("heading", HEADING_CLASSES[kind], lines))
+        elif kind == "quote":
+            self._close_verse()
+            lines = compile_rich_text(payload.get("rich_text", []))
+            self._stanzas.append(stanza("quote", QUOTE_CLASS, lines))
+        elif kind == "divider":
+            self._close_verse()
+            self._stanzas.append(stanza("divider", DIVIDER_CLASS, []))
+        elif "rich_text" in payload:
+            for line in compile_rich_text(payload["rich_text"]):
+                if is_blank(line):
+                    self._close_verse()
+                else:
+                    self._verse.append(line)
+
+    def _close_verse(self):
+        if self._verse:
+            self._stanzas.append(stanza("verse", VERSE_CLASS, self._verse))
+            self._verse = []
+
+    def stanzas(self) -> list[Stanza]:
+        """Returns the stanzas compiled so far, including an unfinished verse."""
+        if self._verse:
+            return [*self._stanzas, stanza("verse", VERSE_CLASS, list(self._verse))]
+        return list(self._stanzas)
+
+
+def compile_blocks(blocks: Iterable[dict[str, Any]]) -> list[Stanza]:
+    compiler = StanzaCompiler()
+    compiler.feed(blocks)
+    return compiler.stanzas()
+
+
+def compile_lines(lines: Iterable[str]) -> list[Stanza]:
+    """Compiles plain-text lines, as bodies were stored before stanzas existed."""
+    return compile_blocks(
+        {"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": line}]}}
+        for line in lines
+    )
+
+
+def as_stanzas(content: list) -> list[Stanza]:
+    """Returns a stored body as stanzas, upgrading the older list-of-lines form."""
+    if content and isinstance(content[0], str):
+        return compile_lines(content)
+    return content
+
+
+def stanza_lines(stanzas: Iterable[Stanza]) -> Iterator[str]:
+    """Yields a body's plain text, one line at a time, for search and export."""
+    for s in stanzas:
+        for line in s["lines"]:
+            yield "".join(text for text, _, _ in line)
@@ -0,0 +1,160 @@
+"""A process-wide LRU cache of compiled poem bodies."""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from app.blocks import as_stanzas, stanza_lines
+from app.metrics import registry
+from app.models import Stanza
+from app.search import search_indexes
+from app.backends import cache_backend
+
+BODY_CACHE_BYTES = int(os.getenv("POETRY_BODY_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Rough CPython overhead of each container and string in a compiled body.
+SPAN_OVERHEAD_BYTES = 220
+LINE_OVERHEAD_BYTES = 60
+STANZA_OVERHEAD_BYTES = 400
+ENTRY_OVERHEAD_BYTES = 200
+
+# Notion stamps edits to the minute, so a body read during the minute it was
+# edited may miss a later edit with the same stamp. The extra minute is for
+# clock skew.
+SETTLE_SECONDS = 120
+
+
+def body_size(content: tuple[Stanza, ...]) -> int:
+    """Estimates how many bytes a cached body keeps alive."""
+    size = ENTRY_OVERHEAD_BYTES
+    for stanza in content:
+        size += STANZA_OVERHEAD_BYTES
+        for line in stanza["lines"]:
+            size += LINE_OVERHEAD_BYTES
+            for text, _, href in line:
+                size += SPAN_OVERHEAD_BYTES + len(text.encode("utf-8")) + len(href)
+    return size
+
+
+def is_settled(edited: str, at: Optional[float] = None) -> bool:
+    """Whether a body read at `at` (default now) has every edit stamped `edited`."""
+    try:
+        stamp = datetime.fromisoformat(edited.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return True
+    return (time.time() if at is None else at) - stamp >= SETTLE_SECONDS
+
+
+class PoemBodyCache:
+    """Caches compiled poem bodies by page id, valid only for one last_edited_time.
+
+    Entries are evicted least-recently-used first once their estimated size
+    exceeds `max_bytes`. A lookup with a different edit time than the one
+    cached is a miss and drops the outdated body.
+    """
+
+    def __init__(self, max_bytes: int = BODY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[str, tuple[Stanza, ...], int]] = (
+            OrderedDict()
+        )
+
+    def get(self, poem_id: str, edited: str) -> Optional[tuple[Stanza, ...]]:
+        entry = self._entries.get(poem_id)
+        if entry is None or entry[0] != edited:
+            if entry is not None:
+                self._drop(poem_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(poem_id)
+        self.hits += 1
+        return entry[1]
+
+    def contains(self, poem_id: str, edited: str) -> bool:
+        """Whether this body is cached, without counting a hit or a miss."""
+        entry = self._entries.get(poem_id)
+        return entry is not None and entry[0] == edited
+
+    def put(self, poem_id: str, edited: str, content: list[Stanza]):
+        body = tuple(content)
+        size = body_size(body)
+        if poem_id in self._entries:
+            self._drop(poem_id)
+        if size > self.max_bytes:
+            return
+        self._entries[poem_id] = (edited, body, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, poem_id: str):
+        _, _, size = self._entries.pop(poem_id)
+        self.size -= size
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+body_cache = PoemBodyCache()
+registry.register_stats("body_cache", body_cache.stats)
+
+
+async def get_body(poem_id: str, edited: str) -> Optional[tuple[Stanza, ...]]:
+    """Returns a cached body from memory, falling back to the shared store."""
+    content = body_cache.get(poem_id, edited)
+    if content is None:
+        stored = await asyncio.to_thread(cache_backend.load_body, poem_id, edited)
+        if stored is not None:
+            stored = as_stanzas(stored)
+            body_cache.put(poem_id, edited, stored)
+            search_indexes.add_content(poem_id, stanza_lines(stored))
+            content = tuple(stored)
+    return content
+
+
+async def save_body(poem_id: str, edited: str, content: list[Stanza]):
+    """Caches a freshly compiled body in memory and in the shared store.
+
+    Bodies read before their edit time settled aren't cached anywhere, since
+    the cache can't tell them apart from a later edit in the same minute.
+    """
+    if not is_settled(edited):
+        return
+    body_cache.put(poem_id, edited, content)
+    await store_body(poem_id, edited, content)
+
+
+async def store_body(poem_id: str, edited: str, content: list[Stanza]):
+    """Saves a body only to the shared store, e.g. one no reader has asked for.
+
+    Speculative reads stay out of the memory cache, so they can't evict
+    the bodies readers are actually opening.
+    """
+    if not is_settled(edited):
+        return
+    search_indexes.add_content(poem_id, stanza_lines(content))
+    await asyncio.to_thread(cache_backend.save_body, poem_id, edited, content)
+
+
+async def has_body(poem_id: str, edited: str) -> bool:
+    """Whether this body is cached or stored, without loading it into memory."""
+    if body_cache.contains(poem_id, edited):
+        return True
+    stored = await asyncio.to_thread(cache_backend.load_body, poem_id, edited)
+    return stored is not None
@@ -0,0 +1,375 @@
+"""A process-wide cache of the poem catalog, shared by every session."""
+
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Mapping, Optional
+
+from app.metrics import registry
+from app.models import Poem, PoemBatch
+from app.notion import DATABASE_ID, notion_token, stream_changes, stream_poems
+from app.backends import CacheBackend, cache_backend, hold_lease
+from app.views import SortOrders
+
+CATALOG_TTL_SECONDS = float(os.getenv("POETRY_CATALOG_TTL", "300"))
+RECONCILE_EVERY = int(os.getenv("POETRY_RECONCILE_EVERY", "6"))
+# Recent versions stay resolvable for sessions that haven't re-synced yet.
+RETAINED_VERSIONS = 4
+# Workers that don't hold the refresh lease re-check the shared store this often.
+FOLLOW_INTERVAL_SECONDS = float(os.getenv("POETRY_FOLLOW_INTERVAL", "15"))
+# On a cold start they check sooner, backing off up to FOLLOW_INTERVAL_SECONDS.
+FIRST_FOLLOW_SECONDS = 0.5
+REFRESH_LEASE = "catalog-refresh"
+# Details filled in after the listing (excerpts) are published at most this often.
+DETAILS_PUBLISH_SECONDS = float(os.getenv("POETRY_DETAILS_PUBLISH", "30"))
+
+PREAMBLE_TITLE = "lost"
+
+# Loaders get the last complete catalog (if any) and yield changes against it.
+# A poem may be sent more than once; the latest copy wins.
+CatalogLoader = Callable[[Optional[list[Poem]]], AsyncIterator[PoemBatch]]
+
+
+def catalog_version(poems: list[Poem]) -> str:
+    """Returns a short content hash identifying this exact list of poems."""
+    payload = json.dumps(poems, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """One fetched copy of the catalog, tagged with its content version.
+
+    Navigation runs newest first, i.e. in reverse of `poems`. `positions`
+    maps each id to its index in `poems`, so lookups and prev/next moves
+    are constant time and never copy the list. `orders` holds the listed
+    poems' positions sorted for each sort option, each sorted on first use.
+    """
+
+    poems: tuple[Poem, ...]
+    preamble: Optional[Poem]
+    version: str
+    fetched_at: float
+    complete: bool = True
+    positions: dict[str, int] = field(default_factory=dict, repr=False)
+    orders: Mapping[str, tuple[int, ...]] = field(default_factory=dict, repr=False)
+
+    def get(self, poem_id: str) -> Optional[Poem]:
+        position = self.positions.get(poem_id)
+        return self.poems[position] if position is not None else None
+
+    def nav_index(self, poem_id: str) -> int:
+        """Returns the poem's place in navigation order, or -1 if it's unknown."""
+        position = self.positions.get(poem_id)
+        return len(self.poems) - 1 - position if position is not None else -1
+
+    def nav_poem(self, index: int) -> Optional[Poem]:
+        """Returns the poem at a place in navigation order, if there is one."""
+        if 0 <= index < len(self.poems):
+            return self.poems[len(self.poems) - 1 - index]
+        return None
+
+    @classmethod
+    def build(cls, poems: list[Poem], complete: bool = True) -> "CatalogSnapshot":
+        """Freezes a list of poems into a snapshot, indexing it as it goes."""
+        preamble = next(
+            (p for p in poems if p["title"].lower() == PREAMBLE_TITLE), None
+        )
+        # Partial snapshots only live until the next batch; don't hash them.
+        version = catalog_version(poems) if complete else f"partial-{len(poems)}"
+        poems = tuple(poems)
+        return cls(
+            poems=poems,
+            preamble=preamble,
+            version=version,
+            fetched_at=time.monotonic(),
+            complete=complete,
+            positions={p["id"]: i for i, p in enumerate(poems)},
+            orders=SortOrders(poems, preamble),
+        )
+
+
+class CatalogCache:
+    """Holds the latest catalog snapshot and refreshes it stale-while-revalidate.
+
+    Readers always get the current snapshot immediately. Once it is older than
+    the TTL, the first reader starts a single background refresh and every
+    other reader keeps being served the stale copy until it lands. On a cold
+    start, a partial snapshot is published as each page of the listing
+    streams in. Once the loader marks the listing done, the catalog is
+    published and saved as complete; details it fills in afterwards
+    (excerpts) land as new versions, at most every DETAILS_PUBLISH_SECONDS.
+    Complete snapshots are hashed and indexed off the event loop.
+
+    With a shared `store`, a refresh only calls Notion if the saved catalog
+    is older than the TTL and this worker wins the refresh lease. Every other
+    worker adopts whatever catalog was saved last, checking back every
+    FOLLOW_INTERVAL_SECONDS, and takes over once the leader stops renewing.
+    """
+
+    def __init__(
+        self, ttl: float = CATALOG_TTL_SECONDS, store: Optional[CacheBackend] = None
+    ):
+        self.ttl = ttl
+        self.store = store
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._versions: OrderedDict[str, CatalogSnapshot] = OrderedDict()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+        self.hits = 0
+        self.misses = 0
+        self.stale_reads = 0
+        # Called with every complete snapshot as it is published.
+        self.listeners: list[Callable[[CatalogSnapshot], None]] = []
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    @property
+    def refresh_task(self) -> Optional[asyncio.Task]:
+        """The in-flight refresh, if one is running."""
+        return self._refresh_task
+
+    def is_stale(self) -> bool:
+        if self._snapshot is None or not self._snapshot.complete:
+            return True
+        return time.monotonic() - self._snapshot.fetched_at >= self.ttl
+
+    def restore(self, poems: list[Poem]):
+        """Seeds an empty cache with a saved catalog, already marked stale."""
+        if self._snapshot is None:
+            snapshot = CatalogSnapshot.build(poems)
+            self._publish(
+                dataclasses.replace(snapshot, fetched_at=snapshot.fetched_at - self.ttl)
+            )
+
+    def refresh(self, loader: CatalogLoader) -> asyncio.Task:
+        """Starts a refresh unless one is already running, and returns it."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._run_refresh(loader))
+        return self._refresh_task
+
+    async def get(self, loader: CatalogLoader) -> CatalogSnapshot:
+        """Returns the cached catalog, waiting for a first batch if nothing is cached."""
+        if self._snapshot is None:
+            self.misses += 1
+            task = self.refresh(loader)
+            await self.wait_for_update()
+            if self._snapshot is None:
+                # The load ended without publishing anything; surface its error.
+                return await asyncio.shield(task)
+        else:
+            self.hits += 1
+            if self.is_stale():
+                self.stale_reads += 1
+                self.refresh(loader)
+        return self._snapshot
+
+    async def wait_for_update(self) -> Optional[CatalogSnapshot]:
+        """Waits for the running refresh to publish a batch or finish."""
+        if self._refresh_task is not None:
+            await self._updated.wait()
+        return self._snapshot
+
+    def lookup(self, version: str) -> Optional[CatalogSnapshot]:
+        """Returns the snapshot with this version, if it is still retained."""
+        return self._versions.get(version)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "versions": len(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_reads": self.stale_reads,
+        }
+
+    def _publish(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+        self._versions.pop(snapshot.version, None)
+        self._versions[snapshot.version] = snapshot
+        while len(self._versions) > RETAINED_VERSIONS:
+            self._versions.popitem(last=False)
+        self._notify()
+        if snapshot.complete:
+            for listener in self.listeners:
+                listener(snapshot)
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def _run_refresh(self, loader: CatalogLoader) -> CatalogSnapshot:
+        try:
+            if self.store is None:
+                return await self._refresh_from(loader)
+            wait = FIRST_FOLLOW_SECONDS
+            while True:
+                if await self._follow():
+                    return self._snapshot
+                async with hold_lease(self.store, REFRESH_LEASE) as leader:
+                    if leader:
+                        return await self._refresh_from(loader)
+                if self._snapshot is not None:
+                    # Another worker is refreshing; check back for its result.
+                    self._publish(
+                        self._aged(
+                            self._snapshot,
+                            max(0.0, self.ttl - FOLLOW_INTERVAL_SECONDS),
+                        )
+                    )
+                    return self._snapshot
+                # Cold start elsewhere: wait for the leader's first catalog.
+                await asyncio.sleep(wait)
+                wait = min(wait * 2, FOLLOW_INTERVAL_SECONDS)
+        except Exception as e:
+            if self._snapshot is None:
+                raise
+            logging.exception(f"Catalog refresh failed, serving stale data: {e}")
+            return self._snapshot
+        finally:
+            self._refresh_task = None
+            self._notify()
+
+    async def _follow(self) -> bool:
+        """Adopts the shared catalog; returns whether it is fresh enough to serve."""
+        info = await asyncio.to_thread(self.store.catalog_info)
+        if info is None:
+            return False
+        version, saved_at = info
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            poems = await asyncio.to_thread(self.store.load_catalog)
+            if poems is None:
+                return False
+            snapshot = await asyncio.to_thread(CatalogSnapshot.build, poems)
+        age = time.time() - saved_at
+        # A version mismatch means it was overwritten between the two reads.
+        if snapshot.version != version or age >= self.ttl:
+            if snapshot is not self._snapshot:
+                self._publish(self._aged(snapshot, self.ttl))
+            return False
+        # Come back when it goes stale, or sooner to pick up a leader's update.
+        self._publish(
+            self._aged(
+                snapshot, self.ttl - min(self.ttl - age, FOLLOW_INTERVAL_SECONDS)
+            )
+        )
+        return True
+
+    def _aged(self, snapshot: CatalogSnapshot, age: float) -> CatalogSnapshot:
+        """Returns the snapshot marked as fetched `age` seconds ago."""
+        return dataclasses.replace(
+            snapshot, fetched_at=time.monotonic() - age, complete=True
+        )
+
+    async def _refresh_from(self, loader: CatalogLoader) -> CatalogSnapshot:
+        previous = (
+            self._snapshot if self._snapshot and self._snapshot.complete else None
+        )
+        poems: list[Poem] = list(previous.poems) if previous else []
+        positions = {p["id"]: i for i, p in enumerate(poems)}
+        removed: set[str] = set()
+        listed = False
+        # Whether batches arrived since the last complete snapshot, and when.
+        pending = False
+        published_at: Optional[float] = None
+        async for batch in loader(previous.poems if previous else None):
+            count = len(poems)
+            for poem in batch.poems:
+                removed.discard(poem["id"])
+                if poem["id"] in positions:
+                    poems[positions[poem["id"]]] = poem
+                else:
+                    positions[poem["id"]] = len(poems)
+                    poems.append(poem)
+            removed.update(batch.removed)
+            pending = True
+            listed = listed or batch.listed
+            if not listed:
+                # Only new poems are worth a partial snapshot; it is keyed by length.
+                if previous is None and len(poems) > count:
+                    self._publish(CatalogSnapshot.build(poems, complete=False))
+                continue
+            now = time.monotonic()
+            if published_at is None or now - published_at >= DETAILS_PUBLISH_SECONDS:
+                await self._publish_complete(poems, removed)
+                pending = False
+                published_at = now
+        if pending or published_at is None:
+            return await self._publish_complete(poems, removed)
+        return self._snapshot
+
+    async def _publish_complete(
+        self, poems: list[Poem], removed: set[str]
+    ) -> CatalogSnapshot:
+        """Publishes and saves the catalog as loaded so far, as a complete one."""
+        if removed:
+            poems = [p for p in poems if p["id"] not in removed]
+        snapshot = await asyncio.to_thread(CatalogSnapshot.build, poems)
+        if self._snapshot and self._snapshot.version == snapshot.version:
+            # Nothing changed: keep the existing objects, just reset the clock.
+            snapshot = dataclasses.replace(
+                self._snapshot, fetched_at=snapshot.fetched_at, complete=True
+            )
+        changed = self._snapshot is None or self._snapshot.version != snapshot.version
+        self._publish(snapshot)
+        if self.store is not None:
+            if changed:
+                await asyncio.to_thread(
+                    self.store.save_catalog, snapshot.version, snapshot.poems
+                )
+            else:
+                await asyncio.to_thread(self.store.touch_catalog, snapshot.version)
+        return snapshot
+
+
+class CatalogSync:
+    """Loads the catalog from Notion, incrementally once a full copy exists.
+
+    The first load lists the whole database. After that, each refresh only
+    queries pages edited since the newest edit time already held, so its cost
+    follows the number of changed poems. Every `reconcile_every` refreshes a
+    full listing runs instead, reusing unchanged excerpts, to drop pages that
+    were archived, trashed or deleted and to renew signed image URLs; a
+    removed page is gone by refresh `reconcile_every + 1` at the latest.
+    """
+
+    def __init__(
+        self, database_id: str = DATABASE_ID, reconcile_every: int = RECONCILE_EVERY
+    ):
+        self.database_id = database_id
+        self.reconcile_every = reconcile_every
+        self.syncs_since_reconcile = 0
+
+    def __call__(self, previous: Optional[list[Poem]]) -> AsyncIterator[PoemBatch]:
+        if previous is None or self.syncs_since_reconcile >= self.reconcile_every:
+            self.syncs_since_reconcile = 0
+            return stream_poems(self.database_id, previous)
+        self.syncs_since_reconcile += 1
+        return stream_changes(self.database_id, previous)
+
+
+catalog_cache = CatalogCache(store=cache_backend)
+registry.register_stats("catalog_cache", catalog_cache.stats)
+
+
+catalog_sync = CatalogSync()
+
+
+@contextlib.asynccontextmanager
+async def catalog_lifespan():
+    """Serves the saved catalog from startup and refreshes it in the background."""
+    poems = await asyncio.to_thread(cache_backend.load_catalog)
+    if poems:
+        catalog_cache.restore(poems)
+    if notion_token():
+        catalog_cache.refresh(catalog_sync)
+    yield
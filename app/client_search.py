@@ -0,0 +1,142 @@
+"""Serves what the browser needs to search the poem list without the server.
+
+With POETRY_CLIENT_SEARCH=1, the search box stops sending an event per
+keystroke. assets/client_search.js downloads a compact index of every
+listed poem's title and excerpt once per catalog version, then filters
+and sorts in the browser. When typing pauses, it asks /_search for
+poems whose full text matches, since only the server indexes bodies.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+from collections import OrderedDict
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from starlette.routing import Route
+
+from app.catalog import CatalogSnapshot, catalog_cache
+from app.images import IMMUTABLE
+from app.search import search_indexes, tokenize
+
+CLIENT_SEARCH_ENABLED = os.getenv("POETRY_CLIENT_SEARCH", "0") != "0"
+CLIENT_INDEX_ROUTE = "/_index"
+SEARCH_ROUTE = "/_search"
+# Encoded indexes kept for sessions still on an older catalog version.
+RETAINED_INDEXES = 2
+MAX_QUERY_LENGTH = 200
+MAX_SEARCH_RESULTS = 500
+
+
+def client_index(catalog: CatalogSnapshot) -> dict:
+    """Returns the listed poems as [id, title, date, title tokens, excerpt tokens].
+
+    Poems stay in catalog order, so the browser can derive every sort
+    order the server has. Tokens come from the server's own tokenizer and
+    keep repeats, so matches score as they do in the search index.
+    """
+    return {
+        "version": catalog.version,
+        "poems": [
+            [
+                p["id"],
+                p["title"],
+                p["date"],
+                " ".join(tokenize(p["title"])),
+                " ".join(tokenize(p["excerpt"])),
+            ]
+            for p in catalog.poems
+            if p is not catalog.preamble
+        ],
+    }
+
+
+def encode_index(catalog: CatalogSnapshot) -> tuple[bytes, bytes]:
+    """Returns the client index as JSON, plain and gzipped."""
+    data = json.dumps(client_index(catalog), separators=(",", ":")).encode()
+    return data, gzip.compress(data, compresslevel=6)
+
+
+class ClientIndexes:
+    """Encodes the client index once per catalog version and keeps the latest few."""
+
+    def __init__(self, retained: int = RETAINED_INDEXES):
+        self.retained = retained
+        self._encoded: OrderedDict[str, asyncio.Task] = OrderedDict()
+
+    async def get(self, catalog: CatalogSnapshot) -> tuple[bytes, bytes]:
+        task = self._encoded.get(catalog.version)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(encode_index, catalog))
+            task.add_done_callback(lambda _: self._forget_failed(catalog.version, task))
+            self._encoded[catalog.version] = task
+            while len(self._encoded) > self.retained:
+                self._encoded.popitem(last=False)
+        return await asyncio.shield(task)
+
+    def _forget_failed(self, version: str, task: asyncio.Task):
+        """Drops a failed encode, so the next request for the version retries it."""
+        if task.cancelled() or task.exception() is not None:
+            if self._encoded.get(version) is task:
+                del self._encoded[version]
+
+
+client_indexes = ClientIndexes()
+
+
+async def serve_client_index(request: Request) -> Response:
+    """Serves the index for a catalog version, or redirects to the current one."""
+    if not CLIENT_SEARCH_ENABLED:
+        return Response(status_code=404)
+    version = request.path_params["version"]
+    catalog = catalog_cache.lookup(version)
+    if catalog is None or not catalog.complete:
+        current = catalog_cache.snapshot
+        if current is None or current.version == version:
+            return Response(status_code=404)
+        return RedirectResponse(
+            f"{CLIENT_INDEX_ROUTE}/{current.version}", status_code=307
+        )
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    data, compressed = await client_indexes.get(catalog)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        data = compressed
+    return Response(data, media_type="application/json", headers=headers)
+
+
+async def serve_search(request: Request) -> Response:
+    """Returns ids of poems whose title, excerpt or body matches, best first."""
+    if not CLIENT_SEARCH_ENABLED:
+        return Response(status_code=404)
+    query = request.query_params.get("q", "")[:MAX_QUERY_LENGTH]
+    catalog = catalog_cache.lookup(request.query_params.get("v", ""))
+    catalog = catalog or catalog_cache.snapshot
+    index = None
+    if catalog is not None and catalog.complete and query.strip():
+        index = search_indexes.get(catalog.version, catalog.poems)
+    if index is None:
+        # Nothing to search yet; the browser keeps its own matches.
+        return JSONResponse({"ready": False, "ids": []})
+    preamble = catalog.preamble["id"] if catalog.preamble else None
+    # The index may be a newer version's; keep only this catalog's poems.
+    ids = [
+        poem_id
+        for poem_id in index.search(query)
+        if poem_id != preamble and poem_id in catalog.positions
+    ]
+    return JSONResponse(
+        {"ready": True, "version": catalog.version, "ids": ids[:MAX_SEARCH_RESULTS]},
+        headers={"Cache-Control": "private, max-age=60"},
+    )
+
+
+client_search_routes = [
+    Route(f"{CLIENT_INDEX_ROUTE}/{{version}}", serve_client_index, methods=["GET"]),
+    Route(SEARCH_ROUTE, serve_search, methods=["GET"]),
+]
@@ -1,18 +1,32 @@
 import reflex as rx
-from app.state import PoetryState, Poem
+from reflex.constants import Dirs
+from reflex.utils.imports import ImportVar
+from reflex.vars import VarData
+from app.client_search import CLIENT_SEARCH_ENABLED
+from app.images import IMAGE_WIDTHS
+from app.state import PoetryState
+
+# Where the backend serves from, as seen by the browser (it differs from the
+# frontend's origin in development).
+backend_origin = rx.Var(
+    _js_expr="getBackendURL(env.PING).origin",
+    _var_data=VarData(
+        imports={
+            f"$/{Dirs.STATE_PATH}": "getBackendURL",
+            "$/env.json": ImportVar(tag="env", is_default=True),
+        }
+    ),
+).to(str)
 
 
 def app_footer() -> rx.Component:
     """A shared footer for all pages."""
     return rx.el.footer(
         rx.el.div(
+            # Shown by assets/ui_signals.js once the page is scrolled to the end.
             rx.el.p(
                 "Thank you for staying.",
-                class_name=rx.cond(
-                    PoetryState.scrolled_to_bottom,
-                    "text-center text-sm text-gray-400/80 mb-8 transition-opacity duration-1000 opacity-100 font-['Fraunces'] italic",
-                    "text-center text-sm text-gray-400/80 mb-8 transition-opacity duration-1000 opacity-0 font-['Fraunces'] italic",
-                ),
+                class_name="farewell-message text-center text-sm text-gray-400/80 mb-8 transition-opacity duration-1000 opacity-0 font-['Fraunces'] italic",
             ),
             rx.el.p(
                 "© Nikhil Rao — The Privilege of Boredom",
@@ -24,7 +38,20 @@ def app_footer() -> rx.Component:
 
 
 def filter_controls() -> rx.Component:
-    """Controls for searching and sorting poems."""
+    """Controls for searching and sorting poems.
+
+    With client-side search, assets/client_search.js handles both controls
+    and neither sends an event to the server.
+    """
+    if CLIENT_SEARCH_ENABLED:
+        search_props = {}
+        sort_props = {"default_value": PoetryState.sort_by}
+    else:
+        search_props = {"on_change": PoetryState.set_search_term}
+        sort_props = {
+            "value": PoetryState.sort_by,
+            "on_change": PoetryState.set_sort_by,
+        }
     return rx.el.div(
         rx.el.div(
             rx.icon(
@@ -33,7 +60,8 @@ def filter_controls() -> rx.Component:
             ),
             rx.el.input(
                 placeholder="Search...",
-                on_change=PoetryState.set_search_term,
+                id="poem-search",
+                **search_props,
                 class_name="w-full pl-9 pr-4 py-2 bg-transparent border-b border-white/10 focus:ring-0 focus:border-[#B7926F] transition text-[#F3F1EE] placeholder-gray-500 font-['Inter']",
                 default_value=PoetryState.search_term,
             ),
@@ -47,8 +75,8 @@ def filter_controls() -> rx.Component:
                         option, value=option, class_name="bg-gray-900 text-[#F3F1EE]"
                     ),
                 ),
-                value=PoetryState.sort_by,
-                on_change=PoetryState.set_sort_by,
+                id="poem-sort",
+                **sort_props,
                 class_name="w-full bg-transparent border-b border-white/10 px-4 py-2 appearance-none focus:ring-0 focus:border-[#B7926F] transition text-[#F3F1EE] font-['Inter']",
             ),
             rx.icon(
@@ -61,41 +89,75 @@ def filter_controls() -> rx.Component:
     )
 
 
-def preamble_card(poem: Poem) -> rx.Component:
+def preamble_card(poem: rx.Var) -> rx.Component:
     """A special card for the preamble poem, styled as an opening page."""
     return rx.el.a(
         rx.el.h2(
-            poem["title"],
+            poem[1],
             class_name="text-4xl font-['Fraunces'] font-medium text-[#F3F1EE] transition-colors duration-300 hover:text-white/80",
             style={"textShadow": "0 2px 30px rgba(0, 0, 0, 0.2)"},
         ),
-        href=f"/poem/{poem['id']}",
+        href=f"/poem/{poem[0]}",
         class_name="w-full flex flex-col items-center text-center py-16 transition-all duration-400 ease-in-out preamble-fade-in mb-16",
     )
 
 
-def poem_card(poem: Poem) -> rx.Component:
-    """A component to display a single poem title in the list."""
+def poem_card(poem: rx.Var) -> rx.Component:
+    """A component to display a single poem title in the list.
+
+    `poem` is a PoemSummary, i.e. an (id, title, date) array.
+    """
     return rx.el.a(
         rx.el.div(
             rx.el.h3(
-                poem["title"],
+                poem[1],
                 class_name="text-2xl font-['Fraunces'] text-[#EAE6DF] group-hover:text-white transition-colors duration-300",
             ),
-            rx.el.p(
-                poem["date"], class_name="text-sm text-gray-600 font-['Inter'] mt-1"
-            ),
+            rx.el.p(poem[2], class_name="text-sm text-gray-600 font-['Inter'] mt-1"),
             class_name="flex-1",
         ),
         rx.icon(
             "arrow-right",
             class_name="text-gray-600 opacity-0 group-hover:opacity-100 transition-opacity duration-300",
         ),
-        href=f"/poem/{poem['id']}",
+        href=f"/poem/{poem[0]}",
         class_name="w-full flex items-center justify-between py-6 border-b border-white/5 transition-all duration-300 ease-in-out group poem-fade-in",
     )
 
 
+def poem_image(path: rx.Var) -> rx.Component:
+    """A poem's cover image, served by the local image proxy at fitting widths."""
+    base = f"{backend_origin}{path}"
+    return rx.el.img(
+        src=f"{base}/960",
+        src_set=", ".join(f"{base}/{width} {width}w" for width in IMAGE_WIDTHS),
+        sizes="(min-width: 768px) 768px, 100vw",
+        loading="lazy",
+        decoding="async",
+        class_name="w-full h-64 object-cover rounded-xl mb-8 shadow-lg shadow-black/20",
+    )
+
+
+def poem_span(span: rx.Var) -> rx.Component:
+    """One run of text in a poem line: a (text, class_name, href) array."""
+    return rx.cond(
+        span[2] != "",
+        rx.el.a(span[0], href=span[2], class_name=span[1]),
+        rx.el.span(span[0], class_name=span[1]),
+    )
+
+
+def poem_stanza(stanza: rx.Var) -> rx.Component:
+    """A compiled stanza of a poem body, rendered exactly as it was stored."""
+    return rx.el.div(
+        rx.foreach(
+            stanza["lines"],
+            lambda line: rx.el.p(rx.foreach(line, poem_span), class_name="poem-line"),
+        ),
+        class_name=stanza["class_name"],
+    )
+
+
 def skeleton_card() -> rx.Component:
     """A skeleton loading card for the poem list."""
     return rx.el.div(
@@ -107,6 +169,19 @@ def skeleton_card() -> rx.Component:
     )
 
 
+def window_button(label: str, on_click: rx.EventHandler, end: str) -> rx.Component:
+    """A button that moves the rendered window of poems.
+
+    assets/poem_window.js clicks the "more" one as the reader scrolls near it.
+    """
+    return rx.el.button(
+        label,
+        on_click=on_click,
+        custom_attrs={"data-window": end},
+        class_name="w-full py-6 text-sm text-gray-500 hover:text-[#B7926F] font-['Inter'] transition-colors duration-300",
+    )
+
+
 def poetry_grid() -> rx.Component:
     """The main grid to display poems."""
     return rx.cond(
@@ -141,9 +216,43 @@ def poetry_grid() -> rx.Component:
                     class_name="flex flex-col items-center justify-center text-center bg-black/20 p-12 rounded-2xl",
                 ),
                 rx.el.div(
+                    rx.cond(
+                        PoetryState.has_earlier_poems,
+                        window_button(
+                            "Show earlier poems",
+                            PoetryState.load_earlier_poems,
+                            "earlier",
+                        ),
+                    ),
                     rx.foreach(PoetryState.filtered_poems, poem_card),
+                    rx.cond(
+                        PoetryState.has_more_poems,
+                        window_button(
+                            "Show more poems", PoetryState.load_more_poems, "more"
+                        ),
+                    ),
+                    id="poem-window",
                     class_name="w-full",
                 ),
             ),
         ),
-    )
\ No newline at end of file
+    )
+
+
+def client_results() -> rx.Component:
+    """Where assets/client_search.js renders the list while a search is active."""
+    return rx.el.div(
+        id="client-results",
+        class_name="w-full",
+        custom_attrs={
+            "data-version": PoetryState.catalog_version,
+            "data-backend": backend_origin,
+        },
+    )
+
+
+def poem_list() -> rx.Component:
+    """The poem list, plus its client-rendered twin when searching in the browser."""
+    if not CLIENT_SEARCH_ENABLED:
+        return poetry_grid()
+    return rx.fragment(rx.el.div(poetry_grid(), id="server-results"), client_results())
\ No newline at end of file
@@ -0,0 +1,636 @@
+"""Exports the collection as static HTML and JSON that any file server can host.
+
+    python -m app.export --out public
+
+The index and every poem page are written as they look once loaded,
+prev/next links and "N of M" counter included, so reading needs no
+backend session. Each page has a JSON twin with the same data:
+
+    index.html, index.json             the preamble and every poem, newest first
+    poem/<id>/index.html, index.json   the poem, its stanzas and its neighbours
+    img/<id>-<tag>-<width>.<ext>       image variants from the image store
+    tailwind.css                       the Tailwind classes the pages use
+
+The stylesheet is compiled with the app's own Tailwind v3 build, the
+config and CLI Reflex sets up in .web for TailwindV3Plugin (rxconfig.py),
+so run the app or `reflex export` once before the first export.
+
+manifest.json records a fingerprint of what each page was rendered from.
+A later export only renders pages whose fingerprint changed, i.e. edited
+poems and the neighbours linking to them, and only reads bodies for
+those. Adding or removing a poem changes the "of M" on every page, so
+all of them are rewritten, but only the new poem's body is read from
+Notion; the rest come from the store or the previous export.
+
+With POETRY_EXPORT_DIR set, the running app re-exports after every
+catalog refresh; with several workers only the lease holder writes.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import html
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Iterator, Optional
+
+from app.backends import cache_backend, hold_lease
+from app.bodies import get_body, is_settled, store_body
+from app.blocks import as_stanzas
+from app.catalog import CatalogSnapshot, catalog_cache, catalog_sync
+from app.images import IMAGE_WIDTHS, image_store, image_tag, write_atomic
+from app.metrics import registry
+from app.models import Poem, PoemSummary, Stanza, summarize
+from app.notion import close_client, fetch_poem_body, notion_token
+from app.scheduler import Priority
+
+EXPORT_DIR = os.getenv("POETRY_EXPORT_DIR", "")
+# Prefix for every link, for exports served below the root of a site.
+EXPORT_BASE = os.getenv("POETRY_EXPORT_BASE", "").rstrip("/")
+EXPORT_WORKERS = int(os.getenv("POETRY_EXPORT_WORKERS", "4"))
+EXPORT_LEASE = "export"
+MANIFEST = "manifest.json"
+# Bump whenever the markup below changes, so every page is rendered again.
+MANIFEST_FORMAT = 3
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets")
+ASSETS = ("style.css", "ui_signals.js", "favicon.ico", "placeholder.svg")
+FONTS_URL = "https://fonts.googleapis.com/css2?family=Fraunces:ital,opsz,wght@0,9..144,400;0,9..144,700;1,9..144,400;1,9..144,700&family=Inter:ital,wght@0,300;0,400;0,500;1,400&display=swap"
+WEB_DIR = os.path.join(os.path.dirname(ASSETS_DIR), ".web")
+TAILWIND_CSS = "tailwind.css"
+TAILWIND_INPUT = "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n"
+
+ARROW_LEFT = ("m12 19-7-7 7-7", "M19 12H5")
+ARROW_RIGHT = ("M5 12h14", "m12 5 7 7-7 7")
+
+
+def fingerprint(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def escape(text: Any) -> str:
+    return html.escape(str(text), quote=True)
+
+
+def icon(paths: tuple[str, ...], class_name: str, size: int = 24) -> str:
+    """An inline Lucide icon, as rx.icon renders it."""
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        'viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" '
+        f'stroke-linecap="round" stroke-linejoin="round" class="{class_name}">'
+        + "".join(f'<path d="{d}"/>' for d in paths)
+        + "</svg>"
+    )
+
+
+def document(title: str, body: str, base: str) -> str:
+    """Wraps a page body in the head the app's pages share."""
+    return (
+        "<!DOCTYPE html>\n"
+        '<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">\n'
+        f"<title>{escape(title)}</title>\n"
+        f'<link rel="icon" href="{base}/favicon.ico">\n'
+        '<link rel="preconnect" href="https://fonts.googleapis.com">\n'
+        '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>\n'
+        f'<link rel="stylesheet" href="{escape(FONTS_URL)}">\n'
+        f'<link rel="stylesheet" href="{base}/{TAILWIND_CSS}">\n'
+        f'<link rel="stylesheet" href="{base}/style.css">\n'
+        f'<script src="{base}/ui_signals.js" defer></script>\n'
+        f"</head>\n<body>\n{body}\n</body>\n</html>\n"
+    )
+
+
+def tailwind_config() -> Optional[str]:
+    """Fingerprints the app's Tailwind config, or None if .web has no build."""
+    try:
+        with open(os.path.join(WEB_DIR, "tailwind.config.js"), "rb") as f:
+            config = f.read()
+    except OSError:
+        return None
+    if not os.path.exists(os.path.join(WEB_DIR, "node_modules", ".bin", "tailwindcss")):
+        return None
+    return hashlib.sha1(config).hexdigest()
+
+
+def compile_tailwind(root: str) -> bytes:
+    """Compiles the classes used by the HTML under `root` with the app's build."""
+    with tempfile.TemporaryDirectory() as scratch:
+        source = os.path.join(scratch, "input.css")
+        target = os.path.join(scratch, TAILWIND_CSS)
+        with open(source, "w") as f:
+            f.write(TAILWIND_INPUT)
+        subprocess.run(
+            [
+                os.path.join(WEB_DIR, "node_modules", ".bin", "tailwindcss"),
+                "--config",
+                os.path.join(WEB_DIR, "tailwind.config.js"),
+                "--input",
+                source,
+                "--output",
+                target,
+                "--content",
+                os.path.join(os.path.abspath(root), "**", "*.html"),
+                "--minify",
+            ],
+            cwd=WEB_DIR,
+            check=True,
+            capture_output=True,
+        )
+        with open(target, "rb") as f:
+            return f.read()
+
+
+def footer() -> str:
+    """Matches app_footer in app/components.py."""
+    return (
+        '<footer class="w-full flex-shrink-0 mt-24"><div>'
+        "<p class=\"farewell-message text-center text-sm text-gray-400/80 mb-8 transition-opacity duration-1000 opacity-0 font-['Fraunces'] italic\">Thank you for staying.</p>"
+        "<p class=\"font-['Inter'] text-center text-xs text-gray-500/50 pb-12\">© Nikhil Rao — The Privilege of Boredom</p>"
+        "</div></footer>"
+    )
+
+
+def poem_href(base: str, poem_id: str) -> str:
+    return f"{base}/poem/{poem_id}/"
+
+
+def render_index(catalog: CatalogSnapshot, base: str) -> str:
+    """The index page as it looks with the whole list scrolled into view."""
+    preamble = ""
+    if catalog.preamble:
+        preamble = (
+            f'<a href="{poem_href(base, catalog.preamble["id"])}" class="w-full flex flex-col items-center text-center py-16 transition-all duration-400 ease-in-out preamble-fade-in mb-16">'
+            '<h2 class="text-4xl font-[\'Fraunces\'] font-medium text-[#F3F1EE] transition-colors duration-300 hover:text-white/80" style="text-shadow: 0 2px 30px rgba(0, 0, 0, 0.2)">'
+            f'{escape(catalog.preamble["title"])}</h2></a>'
+        )
+    # Matches poem_card in app/components.py.
+    cards = "".join(
+        f'<a href="{poem_href(base, poem["id"])}" class="w-full flex items-center justify-between py-6 border-b border-white/5 transition-all duration-300 ease-in-out group poem-fade-in">'
+        '<div class="flex-1">'
+        f'<h3 class="text-2xl font-[\'Fraunces\'] text-[#EAE6DF] group-hover:text-white transition-colors duration-300">{escape(poem["title"])}</h3>'
+        f'<p class="text-sm text-gray-600 font-[\'Inter\'] mt-1">{escape(poem["date"])}</p>'
+        "</div>"
+        + icon(
+            ARROW_RIGHT,
+            "text-gray-600 opacity-0 group-hover:opacity-100 transition-opacity duration-300",
+        )
+        + "</a>"
+        for poem in (catalog.poems[i] for i in catalog.orders["Recent"])
+    )
+    body = (
+        '<div class="poetic-gradient">'
+        '<div class="vignette-overlay pointer-events-none"></div>'
+        '<main class="min-h-screen text-[#F3F1EE] flex flex-col items-center pt-32 p-4 sm:p-6 md:py-24">'
+        '<div class="max-w-2xl mx-auto w-full px-4">'
+        '<div class="text-center mb-24 header-fade-in">'
+        '<h1 class="text-5xl md:text-6xl font-[\'Fraunces\'] italic font-medium text-[#F3F1EE]" style="text-shadow: 0 2px 40px rgba(0, 0, 0, 0.2)">The Privilege of Boredom</h1>'
+        "<h2 class=\"text-lg text-gray-400/90 mt-4 font-['Inter'] italic\">poems from before and after the break.</h2>"
+        "<p class=\"text-sm text-gray-500/80 mt-12 font-['Inter']\">Attention is costly. Boredom is a luxury.</p>"
+        "</div>"
+        f'{preamble}<div class="mt-16"><div class="w-full">{cards}</div></div>'
+        f"</div>{footer()}</main></div>"
+    )
+    return document("The Privilege of Boredom", body, base)
+
+
+def render_stanza(stanza: Stanza) -> str:
+    """Matches poem_stanza in app/components.py."""
+    lines = []
+    for line in stanza["lines"]:
+        spans = "".join(
+            (
+                f'<a href="{escape(href)}" class="{escape(class_name)}">{escape(text)}</a>'
+                if href
+                else f'<span class="{escape(class_name)}">{escape(text)}</span>'
+            )
+            for text, class_name, href in line
+        )
+        lines.append(f'<p class="poem-line">{spans}</p>')
+    return f'<div class="{escape(stanza["class_name"])}">{"".join(lines)}</div>'
+
+
+def nav_link(base: str, poem: Optional[PoemSummary], previous: bool) -> str:
+    if poem is None:
+        return "<div></div>"
+    title = f"<span class=\"font-['Fraunces']\">{escape(poem.title)}</span>"
+    if previous:
+        inner = icon(ARROW_LEFT, "mr-2", 16) + "<span>Previous: </span>" + title
+    else:
+        inner = title + "<span> :Next</span>" + icon(ARROW_RIGHT, "ml-2", 16)
+    return (
+        f'<a href="{poem_href(base, poem.id)}" class="flex items-center text-gray-400 hover:text-[#B7926F] transition-colors duration-300">'
+        f"{inner}</a>"
+    )
+
+
+def render_poem(data: dict, images: list[tuple[str, int]], base: str) -> str:
+    """A poem page as poem_detail_page shows it once its body has loaded."""
+    image = ""
+    if images:
+        src_set = ", ".join(f"{base}/{path} {width}w" for path, width in images)
+        image = (
+            f'<img src="{base}/{images[-1][0]}" srcset="{src_set}" '
+            'sizes="(min-width: 768px) 768px, 100vw" loading="lazy" decoding="async" '
+            'class="w-full h-64 object-cover rounded-xl mb-8 shadow-lg shadow-black/20">'
+        )
+    prev_poem = PoemSummary(*data["prev"]) if data["prev"] else None
+    next_poem = PoemSummary(*data["next"]) if data["next"] else None
+    body = (
+        '<div class="min-h-screen text-[#F3F1EE] poem-detail-crossfade poetic-gradient">'
+        '<div class="vignette-overlay pointer-events-none"></div>'
+        '<main class="w-full min-h-screen flex flex-col items-center justify-start pt-24 p-4 sm:p-6 md:p-8">'
+        "<p class=\"idle-message fixed inset-0 flex items-center justify-center text-2xl font-['Fraunces'] text-white/30 z-50 transition-opacity duration-1000 opacity-0 pointer-events-none\">be still.</p>"
+        '<div class="p-8 md:p-12 w-full max-w-3xl transition-all duration-500" id="poem-content">'
+        '<div class="opacity-100 transition-opacity w-full">'
+        '<div class="flex items-center justify-start w-full max-w-3xl px-8 md:px-12">'
+        f'<a href="{base}/" class="flex items-center text-[#B7926F] font-[\'Inter\'] transition-opacity hover:opacity-80">'
+        f'{icon(ARROW_LEFT, "mr-2", 16)}Back to Collection</a>'
+        "</div></div>"
+        f'<div><div class="h-12"></div>{image}'
+        '<h1 class="text-4xl md:text-5xl font-[\'Fraunces\'] text-[#F3F1EE] mb-2" style="text-shadow: 0 2px 20px rgba(183, 146, 111, 0.3)">'
+        f'{escape(data["title"])}</h1>'
+        "<p class=\"opacity-100 transition-opacity text-md text-gray-500 mb-12 font-['Inter']\">"
+        f'{escape(data["date"])}</p>'
+        '<div class="text-xl text-[#F3F1EE]/80 font-[\'Inter\'] whitespace-pre-wrap poem-fade-in" style="line-height: 1.8">'
+        + "".join(render_stanza(s) for s in data["stanzas"])
+        + "</div></div></div>"
+        '<div class="opacity-100 transition-opacity flex justify-between items-center w-full max-w-3xl mt-8 px-4">'
+        + nav_link(base, prev_poem, previous=True)
+        + f'<p class="text-gray-500 font-[\'Inter\'] text-sm">{data["position"] + 1} of {data["total"]}</p>'
+        + nav_link(base, next_poem, previous=False)
+        + f"</div>{footer()}</main></div>"
+    )
+    return document(data["title"], body, base)
+
+
+def index_data(catalog: CatalogSnapshot) -> dict:
+    return {
+        "version": catalog.version,
+        "total": len(catalog.poems),
+        "preamble": summarize(catalog.preamble) if catalog.preamble else None,
+        "poems": [summarize(catalog.poems[i]) for i in catalog.orders["Recent"]],
+    }
+
+
+def poem_page(catalog: CatalogSnapshot, position: int) -> dict:
+    """Everything a poem page shows, except its body and image files."""
+    poem = catalog.nav_poem(position)
+    prev_poem = catalog.nav_poem(position - 1) if position > 0 else None
+    next_poem = catalog.nav_poem(position + 1)
+    return {
+        "id": poem["id"],
+        "title": poem["title"],
+        "date": poem["date"],
+        "edited": poem["edited"],
+        # The signed image URL changes on every listing; the edit tag doesn't.
+        "image": image_tag(poem) if poem.get("image_url") else None,
+        "position": position,
+        "total": len(catalog.poems),
+        "prev": summarize(prev_poem) if prev_poem else None,
+        "next": summarize(next_poem) if next_poem else None,
+    }
+
+
+class StaticExport:
+    """Writes catalogs to `root` as static pages, rendering only what changed."""
+
+    def __init__(
+        self,
+        root: str = EXPORT_DIR,
+        base: str = EXPORT_BASE,
+        workers: int = EXPORT_WORKERS,
+    ):
+        self.root = root
+        self.base = base
+        self.workers = workers
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.fetched = 0
+        self.failed = 0
+        self._exported: Optional[str] = None
+        self._pending: Optional[CatalogSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self._path(MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return manifest if manifest.get("format") == MANIFEST_FORMAT else {}
+
+    def _write(self, relpath: str, data: str):
+        write_atomic(self._path(relpath), data.encode("utf-8"))
+
+    async def export(self, catalog: CatalogSnapshot, force: bool = False) -> dict:
+        """Brings the export in line with `catalog`; returns what this run did."""
+        before = self.stats()
+        manifest = {} if force else await asyncio.to_thread(self._load_manifest)
+        if manifest.get("base") != self.base:
+            manifest = {}
+        old_pages: dict[str, dict] = manifest.get("pages", {})
+        pages: dict[str, dict] = {}
+        stale = []
+        for position in range(len(catalog.poems)):
+            data = poem_page(catalog, position)
+            entry = old_pages.get(data["id"])
+            if entry and entry["fingerprint"] == fingerprint(data):
+                pages[data["id"]] = entry
+                self.unchanged += 1
+            else:
+                stale.append(data)
+        queue = iter(stale)
+        await asyncio.gather(
+            *[
+                self._worker(catalog, queue, pages, old_pages)
+                for _ in range(self.workers)
+            ]
+        )
+
+        for poem_id in old_pages.keys() - pages.keys():
+            await asyncio.to_thread(self._remove, poem_id, old_pages[poem_id])
+        listing = index_data(catalog)
+        index = fingerprint(listing)
+        if manifest.get("index") != index:
+            await asyncio.to_thread(
+                self._write, "index.html", render_index(catalog, self.base)
+            )
+            await asyncio.to_thread(
+                self._write, "index.json", json.dumps(listing, separators=(",", ":"))
+            )
+            self.written += 1
+        assets = await asyncio.to_thread(self._copy_assets, manifest.get("assets", {}))
+        tailwind = await self._tailwind(manifest.get("tailwind"), before["written"])
+        await asyncio.to_thread(
+            self._write,
+            MANIFEST,
+            json.dumps(
+                {
+                    "format": MANIFEST_FORMAT,
+                    "base": self.base,
+                    "version": catalog.version,
+                    "index": index,
+                    "assets": assets,
+                    "tailwind": tailwind,
+                    "pages": pages,
+                },
+                separators=(",", ":"),
+            ),
+        )
+        done = {key: value - before[key] for key, value in self.stats().items()}
+        return {"pages": len(catalog.poems), "rendered": len(stale), **done}
+
+    async def _worker(
+        self,
+        catalog: CatalogSnapshot,
+        queue: Iterator[dict],
+        pages: dict[str, dict],
+        old_pages: dict[str, dict],
+    ):
+        for data in queue:
+            poem = catalog.get(data["id"])
+            try:
+                stanzas = await self._body(poem)
+                images, files = await self._images(poem)
+            except Exception as e:
+                # Keep its old files, but with no fingerprint the next export retries it.
+                self.failed += 1
+                logging.exception(f"Failed to export poem {poem['id']}: {e}")
+                old = old_pages.get(poem["id"])
+                pages[poem["id"]] = {
+                    "fingerprint": "",
+                    "files": old["files"] if old else [],
+                }
+                continue
+            page = {**data, "stanzas": stanzas}
+            folder = os.path.join("poem", poem["id"])
+            await asyncio.to_thread(
+                self._write,
+                os.path.join(folder, "index.html"),
+                render_poem(page, images, self.base),
+            )
+            await asyncio.to_thread(
+                self._write,
+                os.path.join(folder, "index.json"),
+                json.dumps(page, separators=(",", ":")),
+            )
+            old = old_pages.get(poem["id"])
+            for relpath in set(old["files"] if old else ()) - set(files):
+                # Variants of the image from an earlier edit.
+                await asyncio.to_thread(self._discard, relpath)
+            # A body read before its edit time settled is rendered again next time.
+            settled = is_settled(poem["edited"])
+            pages[poem["id"]] = {
+                "fingerprint": fingerprint(data) if settled else "",
+                "files": files,
+            }
+            self.written += 1
+
+    async def _body(self, poem: Poem) -> list[Stanza]:
+        """Reads a body from the store, the previous export, or else Notion."""
+        stanzas = await get_body(poem["id"], poem["edited"])
+        if stanzas is not None:
+            return list(stanzas)
+        exported = await asyncio.to_thread(self._exported_body, poem)
+        if exported is not None:
+            return exported
+        if not notion_token():
+            raise LookupError("Body not stored and NOTION_API_KEY is not set")
+        stanzas = await fetch_poem_body(poem["id"], Priority.PREFETCH)
+        await store_body(poem["id"], poem["edited"], stanzas)
+        self.fetched += 1
+        return stanzas
+
+    def _exported_body(self, poem: Poem) -> Optional[list[Stanza]]:
+        path = self._path("poem", poem["id"], "index.json")
+        try:
+            with open(path) as f:
+                page = json.load(f)
+            written = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+        if page.get("edited") != poem["edited"]:
+            return None
+        if not is_settled(poem["edited"], at=written):
+            return None
+        return as_stanzas(page["stanzas"])
+
+    async def _images(self, poem: Poem) -> tuple[list[tuple[str, int]], list[str]]:
+        """Copies the poem's image variants in; returns its srcset and files."""
+        if not poem.get("image_url"):
+            return [], []
+        # Without Pillow every width is the same original; keep it once.
+        variants: dict[str, tuple[int, str]] = {}
+        for width in IMAGE_WIDTHS:
+            path, media_type, _ = await image_store.variant(poem, width)
+            variants[path] = (width, media_type)
+        images = []
+        for source, (width, media_type) in variants.items():
+            extension = mimetypes.guess_extension(media_type) or ""
+            relpath = f"img/{poem['id']}-{image_tag(poem)}-{width}{extension}"
+            if not os.path.exists(self._path(relpath)):
+                await asyncio.to_thread(self._copy, source, relpath)
+            images.append((relpath, width))
+        return images, [relpath for relpath, _ in images]
+
+    def _copy(self, source: str, relpath: str):
+        target = self._path(relpath)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(source, partial)
+        os.replace(partial, target)
+
+    def _copy_assets(self, copied: dict[str, str]) -> dict[str, str]:
+        assets = {}
+        for name in ASSETS:
+            with open(os.path.join(ASSETS_DIR, name), "rb") as f:
+                data = f.read()
+            assets[name] = hashlib.sha1(data).hexdigest()
+            if copied.get(name) != assets[name]:
+                write_atomic(self._path(name), data)
+        return assets
+
+    async def _tailwind(self, compiled: Optional[str], written: int) -> Optional[str]:
+        """Recompiles tailwind.css if pages or the config changed; returns its config.
+
+        Returns None when it couldn't compile, so the next export tries again.
+        """
+        config = await asyncio.to_thread(tailwind_config)
+        if config is None:
+            logging.warning(
+                f"No Tailwind build in {WEB_DIR}; the export has no {TAILWIND_CSS}."
+            )
+            return None
+        if (
+            compiled == config
+            and self.written == written
+            and os.path.exists(self._path(TAILWIND_CSS))
+        ):
+            return config
+        try:
+            data = await asyncio.to_thread(compile_tailwind, self.root)
+        except Exception as e:
+            self.failed += 1
+            logging.exception(f"Failed to compile {TAILWIND_CSS}: {e}")
+            return None
+        await asyncio.to_thread(write_atomic, self._path(TAILWIND_CSS), data)
+        return config
+
+    def _discard(self, relpath: str):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(relpath))
+
+    def _remove(self, poem_id: str, entry: dict):
+        """Deletes the pages and images of a poem no longer in the catalog."""
+        for relpath in entry["files"]:
+            self._discard(relpath)
+        shutil.rmtree(self._path("poem", poem_id), ignore_errors=True)
+        self.removed += 1
+
+    def schedule(self, snapshot: CatalogSnapshot):
+        """Exports a published catalog, after any export already running."""
+        self._pending = snapshot
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self._pending is not None:
+                snapshot, self._pending = self._pending, None
+                # Refreshes that find nothing new republish the same version.
+                if snapshot.version == self._exported:
+                    continue
+                try:
+                    async with hold_lease(cache_backend, EXPORT_LEASE) as leader:
+                        # Otherwise another worker is writing the same files.
+                        if leader:
+                            result = await self.export(snapshot)
+                            if not result["failed"]:
+                                self._exported = snapshot.version
+                except Exception as e:
+                    logging.exception(
+                        f"Failed to export catalog {snapshot.version}: {e}"
+                    )
+        finally:
+            self._task = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "written": self.written,
+            "unchanged": self.unchanged,
+            "removed": self.removed,
+            "fetched": self.fetched,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        self._pending = None
+        if self._task is not None:
+            self._task.cancel()
+
+
+exporter = StaticExport()
+registry.register_stats("export", exporter.stats)
+
+
+@contextlib.asynccontextmanager
+async def export_lifespan():
+    """Re-exports after every catalog refresh while POETRY_EXPORT_DIR is set."""
+    if EXPORT_DIR:
+        catalog_cache.listeners.append(exporter.schedule)
+        if catalog_cache.snapshot is not None and catalog_cache.snapshot.complete:
+            exporter.schedule(catalog_cache.snapshot)
+    try:
+        yield
+    finally:
+        if exporter.schedule in catalog_cache.listeners:
+            catalog_cache.listeners.remove(exporter.schedule)
+        exporter.close()
+
+
+async def export_once(root: str, base: str, force: bool) -> dict:
+    """Loads the catalog (the saved one, refreshed if stale) and exports it."""
+    poems = await asyncio.to_thread(cache_backend.load_catalog)
+    if poems:
+        catalog_cache.restore(poems)
+    try:
+        if notion_token():
+            catalog = await catalog_cache.refresh(catalog_sync)
+        else:
+            catalog = catalog_cache.snapshot
+        if catalog is None:
+            raise SystemExit("No saved catalog, and NOTION_API_KEY is not set.")
+        return await StaticExport(root, base).export(catalog, force=force)
+    finally:
+        await close_client()
+        await image_store.close()
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", default=EXPORT_DIR or "public", help="output folder")
+    parser.add_argument("--base", default=EXPORT_BASE, help="URL prefix for links")
+    parser.add_argument(
+        "--force", action="store_true", help="render every page, ignoring the manifest"
+    )
+    args = parser.parse_args(argv)
+    result = asyncio.run(export_once(args.out, args.base.rstrip("/"), args.force))
+    json.dump(result, sys.stdout)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""A local, content-addressed cache and resizing proxy for poem images.
+
+Notion hands out image URLs that are signed for about an hour, so the
+browser can't cache them and they break on a stale page. Instead each
+image is downloaded once, stored under the SHA-256 of its bytes, and
+served in a few fixed widths from our own route with long-lived caching.
+Re-encoding needs Pillow; without it the original is served at every width.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+from typing import Optional
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import FileResponse, RedirectResponse, Response
+from starlette.routing import Route
+
+from app.catalog import catalog_cache
+from app.metrics import registry
+from app.models import Poem
+from app.notion import SingleFlight, fetch_page, notion_token
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+IMAGE_DIR = os.getenv("POETRY_IMAGE_DIR", ".data/images")
+IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+IMAGE_QUALITY = int(os.getenv("POETRY_IMAGE_QUALITY", "80"))
+MAX_IMAGE_BYTES = int(os.getenv("POETRY_MAX_IMAGE_BYTES", str(25 * 1024 * 1024)))
+IMAGE_ROUTE = "/_img"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def image_tag(poem: Poem) -> str:
+    """Returns a token that changes whenever the poem (and so its image) is edited."""
+    return hashlib.sha1(f"{poem['id']}:{poem['edited']}".encode()).hexdigest()[:12]
+
+
+def image_path(poem: Poem) -> Optional[str]:
+    """Returns the proxied path for a poem's image, to be suffixed with a width."""
+    if not poem.get("image_url"):
+        return None
+    return f"{IMAGE_ROUTE}/{poem['id']}/{image_tag(poem)}"
+
+
+def width_bucket(width: int) -> int:
+    return next((w for w in IMAGE_WIDTHS if w >= width), IMAGE_WIDTHS[-1])
+
+
+def encode_variant(source: str, target: str, width: int) -> str:
+    """Writes a resized copy of `source` no wider than `width`; returns its type."""
+    webp = features.check("webp")
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if webp and "A" in image.getbands() else "RGB")
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if webp:
+            image.save(buffer, "WEBP", quality=IMAGE_QUALITY, method=4)
+        else:
+            image.save(buffer, "JPEG", quality=IMAGE_QUALITY, optimize=True)
+    write_atomic(target, buffer.getvalue())
+    return "image/webp" if webp else "image/jpeg"
+
+
+def write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+class ImageStore:
+    """Downloads each poem image once and keeps its resized variants on disk.
+
+    Layout under `root`: `src/<sha256>` holds originals, `refs/<id>-<tag>`
+    records which original (and media type) a poem edit points to, and
+    `variants/<sha256>-<width>` holds re-encoded copies next to a `.type`
+    file naming their media type.
+    """
+
+    def __init__(self, root: str = IMAGE_DIR):
+        self.root = root
+        self.downloads = 0
+        self.encodes = 0
+        self._flight = SingleFlight()
+        self._variant_types: dict[str, str] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=30, follow_redirects=True)
+        return self._http
+
+    async def close(self):
+        http, self._http = self._http, None
+        if http is not None:
+            await http.aclose()
+
+    async def variant(self, poem: Poem, width: int) -> tuple[str, str, str]:
+        """Returns (path, media type, digest) of the poem's image at this width."""
+        digest, media_type = await self._flight.do(
+            f"source:{poem['id']}:{image_tag(poem)}", lambda: self._source(poem)
+        )
+        if Image is None:
+            return os.path.join(self.root, "src", digest), media_type, digest
+        path = os.path.join(self.root, "variants", f"{digest}-{width}")
+        media_type = await self._flight.do(
+            f"variant:{digest}:{width}", lambda: self._variant(digest, path, width)
+        )
+        return path, media_type, digest
+
+    async def _variant(self, digest: str, path: str, width: int) -> str:
+        media_type = self._variant_types.get(path)
+        if media_type is not None:
+            return media_type
+        type_path = f"{path}.type"
+        if os.path.exists(path) and os.path.exists(type_path):
+            with open(type_path) as f:
+                media_type = f.read()
+        else:
+            source = os.path.join(self.root, "src", digest)
+            media_type = await asyncio.to_thread(encode_variant, source, path, width)
+            await asyncio.to_thread(write_atomic, type_path, media_type.encode())
+            self.encodes += 1
+        self._variant_types[path] = media_type
+        return media_type
+
+    async def _source(self, poem: Poem) -> tuple[str, str]:
+        ref = os.path.join(self.root, "refs", f"{poem['id']}-{image_tag(poem)}")
+        if os.path.exists(ref):
+            with open(ref) as f:
+                saved = json.load(f)
+            return saved["digest"], saved["type"]
+        data, media_type = await self._download(poem)
+        digest = hashlib.sha256(data).hexdigest()
+        source = os.path.join(self.root, "src", digest)
+        if not os.path.exists(source):
+            await asyncio.to_thread(write_atomic, source, data)
+        payload = json.dumps({"digest": digest, "type": media_type}).encode()
+        await asyncio.to_thread(write_atomic, ref, payload)
+        self.downloads += 1
+        return digest, media_type
+
+    async def _download(self, poem: Poem) -> tuple[bytes, str]:
+        try:
+            return await self._get(poem["image_url"])
+        except httpx.HTTPStatusError as e:
+            # The signed URL has probably expired; ask Notion for a new one.
+            if e.response.status_code not in (400, 403) or not notion_token():
+                raise
+            fresh = await fetch_page(poem["id"])
+            if not fresh or not fresh["image_url"]:
+                raise
+            return await self._get(fresh["image_url"])
+
+    async def _get(self, url: str) -> tuple[bytes, str]:
+        async with self._client().stream("GET", url) as response:
+            response.raise_for_status()
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image larger than {MAX_IMAGE_BYTES} bytes")
+                chunks.append(chunk)
+        media_type = response.headers.get("content-type", "application/octet-stream")
+        return b"".join(chunks), media_type.split(";")[0]
+
+    def stats(self) -> dict[str, int]:
+        return {"downloads": self.downloads, "encodes": self.encodes}
+
+
+image_store = ImageStore()
+registry.register_stats("image_store", image_store.stats)
+
+
+async def serve_image(request: Request) -> Response:
+    """Serves a poem image variant, or redirects to the canonical URL for it."""
+    poem_id = request.path_params["poem_id"]
+    tag = request.path_params["tag"]
+    width = request.path_params["width"]
+    catalog = catalog_cache.snapshot
+    poem = catalog.get(poem_id) if catalog else None
+    if not poem or not poem.get("image_url"):
+        return Response(status_code=404)
+    bucket = width_bucket(width)
+    if tag != image_tag(poem) or width != bucket:
+        # An old edit or an odd width: send the browser to the cacheable URL.
+        return RedirectResponse(f"{image_path(poem)}/{bucket}", status_code=307)
+    try:
+        path, media_type, digest = await image_store.variant(poem, bucket)
+    except Exception as e:
+        logging.exception(f"Failed to serve image for {poem_id}: {e}")
+        return Response(status_code=502)
+    etag = f'"{digest[:32]}-{bucket}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+image_route = Route(
+    f"{IMAGE_ROUTE}/{{poem_id}}/{{tag}}/{{width:int}}", serve_image, methods=["GET"]
+)
+
+
+@contextlib.asynccontextmanager
+async def images_lifespan():
+    """Closes the image download client on shutdown."""
+    try:
+        yield
+    finally:
+        await image_store.close()
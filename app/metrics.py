@@ -0,0 +1,239 @@
+"""In-process metrics for the app, served in the Prometheus text format.
+
+Off unless POETRY_METRICS is set to 1. While off, the timing helpers hand
+back the function they were given, unchanged, and the route answers 404,
+so instrumented code costs nothing extra.
+"""
+
+import bisect
+import functools
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+
+METRICS_ENABLED = os.getenv("POETRY_METRICS", "0") != "0"
+METRICS_ROUTE = "/metrics"
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...], **extra) -> str:
+    pairs = [*zip(names, values), *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, per combination of labels."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: a count for each bucket plus +Inf, then the sum.
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = format_labels(self.labels, labels, le=format_value(bound))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            tags = format_labels(self.labels, labels)
+            yield f"{self.name}_sum{tags} {format_value(total)}"
+            yield f"{self.name}_count{tags} {cumulative}"
+
+
+class Counter:
+    """A monotonically increasing count, per combination of labels."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self._values.items()):
+            tags = format_labels(self.labels, labels)
+            yield f"{self.name}{tags} {format_value(value)}"
+
+
+class Registry:
+    """Holds every metric, plus the stats() of caches read at scrape time."""
+
+    def __init__(self):
+        self._metrics: list = []
+        self._stats: dict[str, Callable[[], dict[str, int]]] = {}
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, component: str, stats: Callable[[], dict[str, int]]):
+        """Exports a component's stats() as gauges, and its hit ratio if it has one."""
+        self._stats[component] = stats
+
+    def _collect_stats(self) -> Iterator[str]:
+        ratios = []
+        for component, stats in sorted(self._stats.items()):
+            values = stats()
+            for key, value in sorted(values.items()):
+                name = f"poetry_{component}_{key}"
+                yield f"# TYPE {name} gauge"
+                yield f"{name} {format_value(value)}"
+            if "hits" in values and "misses" in values:
+                lookups = values["hits"] + values["misses"]
+                ratios.append((component, values["hits"] / lookups if lookups else 0))
+        yield "# HELP poetry_cache_hit_ratio Share of lookups served from the cache."
+        yield "# TYPE poetry_cache_hit_ratio gauge"
+        for component, ratio in ratios:
+            tags = format_labels(("cache",), (component,))
+            yield f"poetry_cache_hit_ratio{tags} {format_value(float(ratio))}"
+
+    def render(self) -> str:
+        lines = [line for metric in self._metrics for line in metric.collect()]
+        lines.extend(self._collect_stats())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+notion_seconds = registry.histogram(
+    "poetry_notion_request_seconds",
+    "Time each Notion API call took, per attempt.",
+    ("operation", "lane"),
+)
+notion_queue_seconds = registry.histogram(
+    "poetry_notion_queue_seconds",
+    "Time Notion calls waited for the rate limit and a free slot.",
+    ("lane",),
+)
+notion_errors = registry.counter(
+    "poetry_notion_errors_total",
+    "Notion API calls that failed, by HTTP status.",
+    ("operation", "status"),
+)
+event_seconds = registry.histogram(
+    "poetry_event_seconds",
+    "Time background events took from start to finish.",
+    ("event",),
+)
+computed_var_seconds = registry.histogram(
+    "poetry_computed_var_seconds",
+    "Time each computed var took to recompute; the count is recomputations.",
+    ("var",),
+)
+delta_bytes = registry.histogram(
+    "poetry_delta_bytes",
+    "Size of each state delta sent to a client, per state.",
+    ("state",),
+    buckets=SIZE_BUCKETS,
+)
+
+
+def timed(histogram: Histogram, label: str, fn: F) -> F:
+    """Returns `fn` recording its duration under `label`, or `fn` itself if off."""
+    if not METRICS_ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start, label)
+
+    return run
+
+
+def timed_event(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Records how long each run of a background event handler takes."""
+    if not METRICS_ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    async def run(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            event_seconds.observe(time.perf_counter() - start, fn.__name__)
+
+    return run
+
+
+async def serve_metrics(request: Request) -> Response:
+    """Serves every metric in the Prometheus text exposition format."""
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+metrics_route = Route(METRICS_ROUTE, serve_metrics, methods=["GET"])
@@ -0,0 +1,51 @@
+from typing import NamedTuple, TypedDict, Optional
+
+
+class Poem(TypedDict):
+    id: str
+    title: str
+    date: str
+    edited: str
+    image_url: Optional[str]
+    excerpt: str
+    content: list[str]
+
+
+class Stanza(TypedDict):
+    """A render-ready block of a poem body, compiled once from Notion blocks.
+
+    Each line is a list of (text, class_name, href) spans; href is "" for
+    plain text.
+    """
+
+    kind: str
+    class_name: str
+    lines: list[list[tuple[str, str, str]]]
+
+
+class PoemSummary(NamedTuple):
+    """The part of a poem that list entries and navigation links render.
+
+    Sent to the client as a bare [id, title, date] array rather than an
+    object, so list updates don't repeat the key names for every poem.
+    """
+
+    id: str
+    title: str
+    date: str
+
+
+def summarize(poem: Poem) -> PoemSummary:
+    return PoemSummary(poem["id"], poem["title"], poem["date"])
+
+
+class PoemBatch(NamedTuple):
+    """One step of a catalog load: poems to add or replace, and ids to drop.
+
+    `listed` marks the batch after which every poem and removal has been
+    sent; later batches only fill in details such as excerpts.
+    """
+
+    poems: list[Poem]
+    removed: tuple[str, ...] = ()
+    listed: bool = False
@@ -0,0 +1,386 @@
+"""Helpers for reading the poem collection out of Notion."""
+
+import asyncio
+import contextlib
+import importlib.util
+import logging
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import httpx
+from notion_client import AsyncClient
+
+from app.blocks import StanzaCompiler
+from app.metrics import registry
+from app.models import Poem, PoemBatch, Stanza
+from app.scheduler import Lane, Priority, scheduler
+
+DATABASE_ID = os.getenv("NOTION_DATABASE_ID", "6e09b54e-712e-495a-8dd9-835da66b0e40")
+# Points the client at a stand-in server, e.g. the one in bench/fake_notion.py.
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com")
+
+NOTION_MAX_CONNECTIONS = int(os.getenv("POETRY_NOTION_MAX_CONNECTIONS", "10"))
+NOTION_MAX_KEEPALIVE = int(os.getenv("POETRY_NOTION_MAX_KEEPALIVE", "10"))
+NOTION_KEEPALIVE_EXPIRY = float(os.getenv("POETRY_NOTION_KEEPALIVE_EXPIRY", "60"))
+NOTION_TIMEOUT = float(os.getenv("POETRY_NOTION_TIMEOUT", "30"))
+NOTION_CONNECT_TIMEOUT = float(os.getenv("POETRY_NOTION_CONNECT_TIMEOUT", "5"))
+
+_client: Optional[AsyncClient] = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one outstanding request.
+
+    The first caller for a key starts the request; anyone asking for the same
+    key before it finishes awaits that request instead of issuing their own.
+    Calls made on a scheduler `lane` are raised to the most urgent lane of
+    everyone waiting on them, so joining a queued prefetch never makes an
+    interactive read wait behind lower-priority calls.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, tuple[asyncio.Task, Optional[Lane]]] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(
+        self, key: str, fn: Callable[[], Awaitable[Any]], lane: Optional[Lane] = None
+    ) -> Any:
+        entry = self._in_flight.get(key)
+        if entry is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = (task, lane)
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+            task, shared = entry
+            if lane is not None and shared is not None:
+                shared.raise_to(lane.priority)
+        # Shield so one caller going away doesn't cancel the shared request.
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+flight = SingleFlight()
+registry.register_stats("notion_flight", flight.stats)
+
+
+def notion_token() -> Optional[str]:
+    """Returns the Notion API key from the environment, if set."""
+    return os.getenv("NOTION_API_KEY")
+
+
+def get_client() -> AsyncClient:
+    """Returns this process's Notion client, creating its connection pool once."""
+    global _client
+    if _client is None:
+        http = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=NOTION_MAX_CONNECTIONS,
+                max_keepalive_connections=NOTION_MAX_KEEPALIVE,
+                keepalive_expiry=NOTION_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _client = AsyncClient(
+            auth=notion_token(), client=http, base_url=NOTION_BASE_URL
+        )
+        # notion_client overwrites the pool's timeout with a single value; put
+        # back the split connect/read timeouts.
+        http.timeout = httpx.Timeout(NOTION_TIMEOUT, connect=NOTION_CONNECT_TIMEOUT)
+    return _client
+
+
+async def close_client():
+    """Closes the shared Notion client's connection pool, if one was opened."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+@contextlib.asynccontextmanager
+async def notion_lifespan():
+    """App lifespan task that shuts the shared Notion client down cleanly."""
+    try:
+        yield
+    finally:
+        await close_client()
+
+
+async def query_database(
+    notion: AsyncClient,
+    database_id: str,
+    start_cursor: Optional[str] = None,
+    edited_since: Optional[str] = None,
+    priority: Priority = Priority.CATALOG,
+) -> dict:
+    """Runs one page of a database query, sharing it with identical ones in flight."""
+    key = f"query:{database_id}"
+    kwargs: dict[str, Any] = {"database_id": database_id}
+    params = []
+    if edited_since is not None:
+        params.append(f"edited_since={edited_since}")
+        kwargs["filter"] = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": edited_since},
+        }
+    if start_cursor is not None:
+        params.append(f"start_cursor={start_cursor}")
+        kwargs["start_cursor"] = start_cursor
+    if params:
+        key += "?" + "&".join(params)
+    lane = Lane(priority)
+    return await flight.do(
+        key,
+        lambda: scheduler.run(
+            lambda: notion.databases.query(**kwargs), lane, "databases.query"
+        ),
+        lane,
+    )
+
+
+async def iter_database_pages(
+    notion: AsyncClient, database_id: str, edited_since: Optional[str] = None
+) -> AsyncIterator[list[dict]]:
+    """Yields each page of database results, following next_cursor to the end."""
+    cursor = None
+    while True:
+        result = await query_database(notion, database_id, cursor, edited_since)
+        yield result.get("results", [])
+        cursor = result.get("next_cursor")
+        if not result.get("has_more") or not cursor:
+            return
+
+
+async def list_blocks(
+    notion: AsyncClient,
+    block_id: str,
+    page_size: Optional[int] = None,
+    start_cursor: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> dict:
+    """Lists a block's children, sharing the call with identical ones in flight."""
+    key = f"blocks:{block_id}"
+    kwargs: dict[str, Any] = {"block_id": block_id}
+    params = []
+    if page_size is not None:
+        params.append(f"page_size={page_size}")
+        kwargs["page_size"] = page_size
+    if start_cursor is not None:
+        params.append(f"start_cursor={start_cursor}")
+        kwargs["start_cursor"] = start_cursor
+    if params:
+        key += "?" + "&".join(params)
+    lane = Lane(priority)
+    return await flight.do(
+        key,
+        lambda: scheduler.run(
+            lambda: notion.blocks.children.list(**kwargs),
+            lane,
+            "blocks.children.list",
+        ),
+        lane,
+    )
+
+
+async def iter_block_pages(
+    notion: AsyncClient, block_id: str, priority: Priority = Priority.INTERACTIVE
+) -> AsyncIterator[list[dict]]:
+    """Yields each page of a block's children, following next_cursor to the end."""
+    cursor = None
+    while True:
+        result = await list_blocks(
+            notion, block_id, start_cursor=cursor, priority=priority
+        )
+        yield result.get("results", [])
+        cursor = result.get("next_cursor")
+        if not result.get("has_more") or not cursor:
+            return
+
+
+async def stream_poems(
+    database_id: str = DATABASE_ID, previous: Optional[list[Poem]] = None
+) -> AsyncIterator[PoemBatch]:
+    """Lists the whole database, yielding poems first bare, then with excerpts.
+
+    Each database page is yielded as soon as it is parsed, so the list can
+    render before any excerpt is fetched. Excerpt reads go through the
+    scheduler's low-priority lane and are yielded again, per database page,
+    once they finish; consumers should let a later copy of a poem replace an
+    earlier one with the same id. Poems from `previous` whose edit time is
+    unchanged keep their excerpt without another read, unless it is empty
+    because the last read failed. Poems that no longer appear in the listing
+    are reported as removed, in a batch marked `listed` that ends the
+    listing; only excerpts follow it.
+    """
+    notion = get_client()
+    known = {p["id"]: p for p in previous or []}
+    seen: set[str] = set()
+    excerpt_batches: list[list[asyncio.Task]] = []
+    try:
+        async for pages in iter_database_pages(notion, database_id):
+            poems = []
+            changed = []
+            for poem in filter(None, map(parse_page, pages)):
+                seen.add(poem["id"])
+                old = known.get(poem["id"])
+                # Older saved catalogs hold "No content." where a read failed.
+                if (
+                    old
+                    and old["edited"] == poem["edited"]
+                    and old["excerpt"] not in ("", "No content.")
+                ):
+                    poem["excerpt"] = old["excerpt"]
+                else:
+                    changed.append(poem)
+                poems.append(poem)
+            yield PoemBatch(poems)
+            excerpt_batches.append(
+                [asyncio.create_task(with_excerpt(notion, p)) for p in changed]
+            )
+        removed = tuple(poem_id for poem_id in known if poem_id not in seen)
+        yield PoemBatch([], removed, listed=True)
+        for tasks in excerpt_batches:
+            if tasks:
+                yield PoemBatch(list(await asyncio.gather(*tasks)))
+    finally:
+        for tasks in excerpt_batches:
+            for task in tasks:
+                task.cancel()
+
+
+async def stream_changes(
+    database_id: str, previous: list[Poem]
+) -> AsyncIterator[PoemBatch]:
+    """Yields only the poems edited since the newest edit time in `previous`.
+
+    Notion reports edit times to the minute, so the query is inclusive and
+    pages whose edit time already matches are skipped, except those edited
+    in the newest minute itself: a later edit in that same minute keeps the
+    same edit time, so they are always read again. Database queries only
+    return live pages, so archived, trashed or deleted pages never show up
+    here; the periodic full listing (stream_poems) reports them as removed.
+    """
+    notion = get_client()
+    known = {p["id"]: p for p in previous}
+    since = max((p["edited"] for p in previous if p["edited"]), default=None)
+    async for pages in iter_database_pages(notion, database_id, edited_since=since):
+        changed = []
+        fallbacks = []
+        for page in pages:
+            poem = parse_page(page)
+            old = known.get(poem["id"]) if poem else None
+            unchanged = old and old["edited"] == poem["edited"] != since
+            if poem and not unchanged:
+                changed.append(poem)
+                # A page re-read at the same edit time keeps its excerpt if
+                # the read fails; an edited one really has lost it.
+                same = old and old["edited"] == poem["edited"]
+                fallbacks.append(old["excerpt"] if same else "")
+        if changed:
+            reads = [with_excerpt(notion, p, f) for p, f in zip(changed, fallbacks)]
+            yield PoemBatch(list(await asyncio.gather(*reads)))
+
+
+async def stream_poem_body(
+    poem_id: str, priority: Priority = Priority.INTERACTIVE
+) -> AsyncIterator[list[Stanza]]:
+    """Yields a poem's stanzas compiled so far, after each page of blocks."""
+    compiler = StanzaCompiler()
+    async for blocks in iter_block_pages(get_client(), poem_id, priority):
+        compiler.feed(blocks)
+        yield compiler.stanzas()
+
+
+async def fetch_poem_body(
+    poem_id: str, priority: Priority = Priority.INTERACTIVE
+) -> list[Stanza]:
+    """Reads every page of a poem's blocks and compiles them into stanzas."""
+    stanzas: list[Stanza] = []
+    async for stanzas in stream_poem_body(poem_id, priority):
+        pass
+    return stanzas
+
+
+async def fetch_page(
+    page_id: str, priority: Priority = Priority.INTERACTIVE
+) -> Optional[Poem]:
+    """Reads one page's properties afresh, e.g. to renew its signed image URL."""
+    notion = get_client()
+    lane = Lane(priority)
+    page = await flight.do(
+        f"page:{page_id}",
+        lambda: scheduler.run(
+            lambda: notion.pages.retrieve(page_id=page_id), lane, "pages.retrieve"
+        ),
+        lane,
+    )
+    return parse_page(page)
+
+
+async def load_poems(database_id: str = DATABASE_ID) -> list[Poem]:
+    """Queries every page of the database and processes it into Poems."""
+    poems: dict[str, Poem] = {}
+    async for batch in stream_poems(database_id):
+        poems.update((p["id"], p) for p in batch.poems)
+    return list(poems.values())
+
+
+def parse_page(page: dict) -> Optional[Poem]:
+    """Turns a Notion page's properties into a Poem with no excerpt yet."""
+    try:
+        properties = page.get("properties", {})
+        title_prop = properties.get("Title", {}).get("title", [])
+        title = title_prop[0]["plain_text"] if title_prop else "Untitled"
+        date_prop = properties.get("Date", {}).get("date", {})
+        date = date_prop.get("start", "") if date_prop else ""
+        image_prop = properties.get("Image", {}).get("files", [])
+        image_url = (
+            image_prop[0]["file"]["url"]
+            if image_prop and image_prop[0].get("file")
+            else None
+        )
+        return {
+            "id": page["id"],
+            "title": title,
+            "date": date,
+            "edited": page.get("last_edited_time", ""),
+            "image_url": image_url,
+            "excerpt": "",
+            "content": [],
+        }
+    except Exception as e:
+        logging.exception(f"Failed to process page: {e}")
+        return None
+
+
+async def with_excerpt(notion: AsyncClient, poem: Poem, fallback: str = "") -> Poem:
+    """Returns a copy of the poem with its excerpt read from the first blocks.
+
+    If the read fails the poem keeps `fallback`, so a flaky read of an
+    unchanged page doesn't turn into a new catalog version.
+    """
+    try:
+        blocks = await list_blocks(
+            notion, poem["id"], page_size=5, priority=Priority.EXCERPT
+        )
+    except Exception as e:
+        # With no fallback the excerpt stays empty, so the next listing retries it.
+        logging.exception(f"Failed to fetch excerpt for {poem['id']}: {e}")
+        return {**poem, "excerpt": fallback}
+    excerpt_lines = []
+    for block in blocks.get("results", []):
+        if block["type"] == "paragraph":
+            text_parts = block.get("paragraph", {}).get("rich_text", [])
+            if text_parts:
+                excerpt_lines.append(text_parts[0]["plain_text"])
+    excerpt = " ".join(excerpt_lines[:3]) + "..." if excerpt_lines else ""
+    return {**poem, "excerpt": excerpt}
@@ -0,0 +1,154 @@
+"""Warms poem bodies in the background so opening a poem rarely waits on Notion."""
+
+import asyncio
+import contextlib
+import logging
+import os
+from typing import Iterator, Optional
+
+from app.bodies import body_cache, has_body, store_body
+from app.catalog import CatalogSnapshot, catalog_cache
+from app.metrics import registry
+from app.models import Poem
+from app.notion import fetch_poem_body, notion_token
+from app.scheduler import Priority
+from app.backends import cache_backend, hold_lease
+
+PREFETCH_ENABLED = os.getenv("POETRY_PREFETCH", "1") != "0"
+PREFETCH_WORKERS = int(os.getenv("POETRY_PREFETCH_WORKERS", "2"))
+PREFETCH_LEASE = "prefetch"
+
+
+class Prefetcher:
+    """Fetches and saves poem bodies ahead of readers asking for them.
+
+    After each catalog refresh, every body missing from the shared store
+    (or saved for an older edit) is read newest first on the PREFETCH lane,
+    which only gets Notion calls no one else is waiting for. When a poem is
+    opened, its neighbours are read on the higher NEIGHBOR lane so "Next"
+    and "Previous" open instantly. A body is only ever fetched once at a
+    time; later requests for it wait on the fetch already running, and
+    raise it to their own lane. Prefetched bodies only go to the shared
+    store, so they never push readers' bodies out of memory. With
+    several workers, only the one holding the prefetch lease warms the
+    shared store.
+    """
+
+    def __init__(self, workers: int = PREFETCH_WORKERS):
+        self.workers = workers
+        self.fetched = 0
+        self.failed = 0
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._warm_all: Optional[asyncio.Task] = None
+        self._warm_version: Optional[str] = None
+        self._warmed_version: Optional[str] = None
+
+    def schedule(self, snapshot: CatalogSnapshot):
+        """Starts warming every body of this catalog, replacing an older run."""
+        if not notion_token() or snapshot.version in (
+            self._warm_version,
+            self._warmed_version,
+        ):
+            return
+        if self._warm_all is not None:
+            self._warm_all.cancel()
+        self._warm_version = snapshot.version
+        self._warm_all = asyncio.get_running_loop().create_task(
+            self._run_warm_all(snapshot)
+        )
+
+    def warm_neighbors(self, catalog: CatalogSnapshot, poem_id: str):
+        """Starts fetching the poems before and after this one, if not cached."""
+        if not notion_token():
+            return
+        index = catalog.nav_index(poem_id)
+        if index < 0:
+            return
+        for neighbor in (catalog.nav_poem(index - 1), catalog.nav_poem(index + 1)):
+            if neighbor is not None and neighbor["id"] not in self._tasks:
+                self._start(neighbor, Priority.NEIGHBOR, check_saved=True)
+
+    async def _run_warm_all(self, snapshot: CatalogSnapshot):
+        try:
+            async with hold_lease(cache_backend, PREFETCH_LEASE) as leader:
+                # Otherwise another worker is already filling the shared store.
+                if leader:
+                    saved = await asyncio.to_thread(cache_backend.body_versions)
+                    missing = (
+                        p
+                        for p in reversed(snapshot.poems)
+                        if saved.get(p["id"]) != p["edited"]
+                    )
+                    await asyncio.gather(
+                        *[self._worker(missing) for _ in range(self.workers)]
+                    )
+                    self._warmed_version = snapshot.version
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"Failed to prefetch poem bodies: {e}")
+        finally:
+            if self._warm_version == snapshot.version:
+                self._warm_version = None
+                self._warm_all = None
+
+    async def _worker(self, poems: Iterator[Poem]):
+        for poem in poems:
+            task = self._tasks.get(poem["id"]) or self._start(
+                poem, Priority.PREFETCH, check_saved=False
+            )
+            await asyncio.shield(task)
+
+    def _start(self, poem: Poem, priority: Priority, check_saved: bool):
+        task = asyncio.get_running_loop().create_task(
+            self._fetch(poem, priority, check_saved)
+        )
+        self._tasks[poem["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(poem["id"], None))
+        return task
+
+    async def _fetch(self, poem: Poem, priority: Priority, check_saved: bool):
+        try:
+            # Another fetch may have cached it since this one was queued.
+            if body_cache.contains(poem["id"], poem["edited"]):
+                return
+            if check_saved and await has_body(poem["id"], poem["edited"]):
+                return
+            stanzas = await fetch_poem_body(poem["id"], priority)
+            await store_body(poem["id"], poem["edited"], stanzas)
+            self.fetched += 1
+        except Exception as e:
+            self.failed += 1
+            logging.exception(f"Failed to prefetch body for {poem['id']}: {e}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "fetched": self.fetched,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        if self._warm_all is not None:
+            self._warm_all.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+prefetcher = Prefetcher()
+registry.register_stats("prefetch", prefetcher.stats)
+
+
+@contextlib.asynccontextmanager
+async def prefetch_lifespan():
+    """Warms bodies after every catalog refresh while the app is running."""
+    if PREFETCH_ENABLED:
+        catalog_cache.listeners.append(prefetcher.schedule)
+        if catalog_cache.snapshot is not None and catalog_cache.snapshot.complete:
+            prefetcher.schedule(catalog_cache.snapshot)
+    try:
+        yield
+    finally:
+        if prefetcher.schedule in catalog_cache.listeners:
+            catalog_cache.listeners.remove(prefetcher.schedule)
+        prefetcher.close()
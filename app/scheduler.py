@@ -0,0 +1,238 @@
+"""Rate-limited, prioritised scheduling for calls to the Notion API."""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import httpx
+from notion_client.errors import RequestTimeoutError
+
+from app.metrics import (
+    METRICS_ENABLED,
+    notion_errors,
+    notion_queue_seconds,
+    notion_seconds,
+    registry,
+)
+
+NOTION_RATE = float(os.getenv("POETRY_NOTION_RATE", "3"))
+NOTION_BURST = int(os.getenv("POETRY_NOTION_BURST", "10"))
+NOTION_CONCURRENCY = int(os.getenv("POETRY_NOTION_CONCURRENCY", "4"))
+NOTION_MAX_RETRIES = int(os.getenv("POETRY_NOTION_MAX_RETRIES", "4"))
+
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+
+class Priority(IntEnum):
+    """Scheduling lanes; lower values are dispatched first."""
+
+    INTERACTIVE = 0
+    CATALOG = 1
+    NEIGHBOR = 2
+    EXCERPT = 3
+    PREFETCH = 4
+
+
+class Lane:
+    """The priority one call is dispatched at, which its waiters can raise.
+
+    A call shared by several callers (see SingleFlight) runs once, so it
+    must not wait behind lower lanes once a more urgent caller joins it.
+    """
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self._queued: Optional[tuple["NotionScheduler", asyncio.Future]] = None
+
+    def raise_to(self, priority: Priority):
+        """Moves the call up to `priority`, even while it is already queued."""
+        if priority >= self.priority:
+            return
+        self.priority = priority
+        if self._queued is not None:
+            scheduler, future = self._queued
+            scheduler._requeue(priority, future)
+
+
+class TokenBucket:
+    """A classic token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> float:
+        """Takes a token and returns 0, or returns how long until one is available."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Returns how long to wait before retrying `error`, or None if it is fatal."""
+    status = getattr(error, "status", None)
+    if status == 429:
+        retry_after = getattr(error, "headers", {}).get("retry-after")
+        try:
+            if retry_after is not None:
+                return float(retry_after) + random.uniform(0, RETRY_BASE_DELAY)
+        except ValueError:
+            pass
+    elif status is not None:
+        if status < 500:
+            return None
+    elif not isinstance(
+        error, (httpx.TransportError, asyncio.TimeoutError, RequestTimeoutError)
+    ):
+        return None
+    # Full jitter exponential backoff.
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+class NotionScheduler:
+    """Runs Notion calls under a shared rate limit, concurrency cap and priority.
+
+    Waiting calls are dispatched strictly by priority lane, then in arrival
+    order. Rate-limited and transient failures are retried with jittered
+    backoff; a 429 also pauses every lane for its Retry-After period, since
+    Notion's limit applies to the whole integration.
+    """
+
+    def __init__(
+        self,
+        rate: float = NOTION_RATE,
+        burst: int = NOTION_BURST,
+        max_concurrency: int = NOTION_CONCURRENCY,
+        max_retries: int = NOTION_MAX_RETRIES,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._slot_freed = asyncio.Event()
+        self._paused_until = 0.0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.retries = 0
+
+    async def run(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        priority: Union[Priority, Lane] = Priority.EXCERPT,
+        operation: str = "notion",
+    ) -> Any:
+        """Runs `fn` once a slot and a token are free, retrying transient errors."""
+        lane = priority if isinstance(priority, Lane) else Lane(priority)
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            await self._acquire(lane)
+            started = time.perf_counter()
+            try:
+                return await fn()
+            except Exception as e:
+                if METRICS_ENABLED:
+                    status = getattr(e, "status", None) or type(e).__name__
+                    notion_errors.inc(operation, str(status))
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                if getattr(e, "status", None) == 429:
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + delay
+                    )
+                logging.warning(
+                    f"Notion call failed ({e}), retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{self.max_retries})"
+                )
+            finally:
+                self._release()
+                if METRICS_ENABLED:
+                    name = lane.priority.name.lower()
+                    notion_queue_seconds.observe(started - queued, name)
+                    notion_seconds.observe(
+                        time.perf_counter() - started, operation, name
+                    )
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "active": self._active,
+            "waiting": sum(1 for _, _, f in self._waiting if not f.done()),
+            "retries": self.retries,
+        }
+
+    async def _acquire(self, lane: Lane):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (lane.priority, next(self._seq), future))
+        lane._queued = (self, future)
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled after being handed a slot: give it back.
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        finally:
+            lane._queued = None
+
+    def _requeue(self, priority: Priority, future: asyncio.Future):
+        """Queues a waiting call again in a higher lane; its old entry is skipped."""
+        if not future.done():
+            heapq.heappush(self._waiting, (priority, next(self._seq), future))
+
+    def _release(self):
+        self._active -= 1
+        self._slot_freed.set()
+
+    async def _dispatch(self):
+        try:
+            while self._waiting:
+                # Cancelled, or already dispatched from a higher lane.
+                if self._waiting[0][2].done():
+                    heapq.heappop(self._waiting)
+                    continue
+                if self._active >= self.max_concurrency:
+                    self._slot_freed.clear()
+                    await self._slot_freed.wait()
+                    continue
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                delay = self._bucket.take()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                _, _, future = heapq.heappop(self._waiting)
+                if future.done():
+                    continue
+                self._active += 1
+                future.set_result(None)
+        finally:
+            self._dispatcher = None
+
+
+scheduler = NotionScheduler()
+registry.register_stats("notion_scheduler", scheduler.stats)
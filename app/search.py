@@ -0,0 +1,241 @@
+"""An inverted index for searching poems by title, excerpt and full text."""
+
+import asyncio
+import bisect
+import contextlib
+import itertools
+import logging
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Iterable, Optional
+
+from app.blocks import as_stanzas, stanza_lines
+from app.models import Poem
+from app.backends import cache_backend
+
+FIELD_WEIGHTS = {"title": 8.0, "excerpt": 2.0, "content": 1.0}
+# A token that is a whole word, not just a prefix of one, scores this much more.
+EXACT_MATCH_BOOST = 1.5
+QUERY_CACHE_SIZE = 256
+# Indexes kept for sessions still on an older catalog version.
+RETAINED_INDEXES = 2
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Generations are unique across indexes, so a view cached against one
+# index is never mistaken for a view of another.
+_generations = itertools.count(1)
+
+
+def normalize(text: str) -> str:
+    """Case-folds text and strips accents so "Café" matches "cafe"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+class SearchIndex:
+    """Maps every normalized token to the poems containing it, with a score.
+
+    Query tokens are matched as prefixes against a sorted vocabulary, so
+    results update sensibly while a word is still being typed. Every query
+    token has to match for a poem to be returned; poems are ranked by the
+    summed field weights of their matches, then by catalog order.
+    """
+
+    def __init__(self, version: str, poems: list[Poem]):
+        self.version = version
+        self._ids = [p["id"] for p in poems]
+        self._positions = {poem_id: i for i, poem_id in enumerate(self._ids)}
+        self._postings: dict[str, dict[int, float]] = {}
+        self._with_content: set[int] = set()
+        self._vocabulary: list[str] = []
+        self._results: OrderedDict[str, list[str]] = OrderedDict()
+        # Changes whenever results may change, so callers can key caches on it.
+        self.generation = next(_generations)
+        for i, poem in enumerate(poems):
+            self._add(i, "title", poem["title"])
+            self._add(i, "excerpt", poem["excerpt"])
+        self._vocabulary = sorted(self._postings)
+
+    def _add(self, doc: int, field: str, text: str):
+        weight = FIELD_WEIGHTS[field]
+        for token in tokenize(text):
+            postings = self._postings.setdefault(token, {})
+            postings[doc] = postings.get(doc, 0.0) + weight
+
+    def add_content(self, poem_id: str, lines: Iterable[str]):
+        """Indexes a poem's full text, once, when its body becomes known."""
+        doc = self._positions.get(poem_id)
+        if doc is None or doc in self._with_content:
+            return
+        for token in self._add_content(poem_id, lines):
+            bisect.insort(self._vocabulary, token)
+        self._results.clear()
+        self.generation = next(_generations)
+
+    def _add_content(self, poem_id: str, lines: Iterable[str]) -> list[str]:
+        """Adds content postings and returns tokens that are new to the index."""
+        doc = self._positions.get(poem_id)
+        if doc is None or doc in self._with_content:
+            return []
+        self._with_content.add(doc)
+        new_tokens = []
+        for line in lines:
+            for token in tokenize(line):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    new_tokens.append(token)
+                postings[doc] = postings.get(doc, 0.0) + FIELD_WEIGHTS["content"]
+        return new_tokens
+
+    def _match(self, token: str) -> dict[int, float]:
+        scores: dict[int, float] = {}
+        vocabulary = self._vocabulary
+        i = bisect.bisect_left(vocabulary, token)
+        while i < len(vocabulary) and vocabulary[i].startswith(token):
+            word = vocabulary[i]
+            boost = EXACT_MATCH_BOOST if word == token else 1.0
+            for doc, score in self._postings[word].items():
+                scores[doc] = scores.get(doc, 0.0) + score * boost
+            i += 1
+        return scores
+
+    def search(self, query: str) -> list[str]:
+        """Returns the ids of matching poems, best match first."""
+        key = normalize(query).strip()
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+        tokens = tokenize(key)
+        scores: Optional[dict[int, float]] = None
+        # Match the rarest-looking (longest) tokens first to shrink the set early.
+        for token in sorted(tokens, key=len, reverse=True):
+            matches = self._match(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    doc: score + matches[doc]
+                    for doc, score in scores.items()
+                    if doc in matches
+                }
+            if not scores:
+                break
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], item[0]))
+        results = [self._ids[doc] for doc, _ in ranked]
+        self._results[key] = results
+        if len(self._results) > QUERY_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return results
+
+
+def build_index(version: str, poems: list[Poem]) -> SearchIndex:
+    """Builds an index, including the full text of every body in the shared store."""
+    index = SearchIndex(version, poems)
+    edited = {p["id"]: p["edited"] for p in poems}
+    for poem_id, (body_edited, content) in cache_backend.load_bodies().items():
+        if edited.get(poem_id) == body_edited:
+            index._add_content(poem_id, stanza_lines(as_stanzas(content)))
+    index._vocabulary = sorted(index._postings)
+    return index
+
+
+class SearchIndexes:
+    """Keeps indexes for the latest few catalog versions, built off the event loop.
+
+    Each version is built at most once while it stays retained. Until a
+    version's own index is ready, the newest one built is served instead;
+    results are poem ids, which views map through their own catalog.
+    Publishing an index, or folding a body into one, wakes everyone in
+    `wait_for_update`, since either can change search results.
+    """
+
+    def __init__(self, retained: int = RETAINED_INDEXES):
+        self.retained = retained
+        self._indexes: OrderedDict[str, SearchIndex] = OrderedDict()
+        self._builds: dict[str, asyncio.Task] = {}
+        # Versions in the order they were first asked for, oldest first.
+        self._requested: OrderedDict[str, None] = OrderedDict()
+        self._updated = asyncio.Event()
+
+    def get(self, version: str, poems: list[Poem]) -> Optional[SearchIndex]:
+        """Returns the index for this version, or the newest built one meanwhile."""
+        index = self._indexes.get(version)
+        if index is not None:
+            self._indexes.move_to_end(version)
+            return index
+        if version not in self._builds:
+            self._requested[version] = None
+            self._builds[version] = asyncio.get_running_loop().create_task(
+                self._build(version, poems)
+            )
+        return self._newest()
+
+    def _newest(self) -> Optional[SearchIndex]:
+        for version in reversed(self._requested):
+            if version in self._indexes:
+                return self._indexes[version]
+        return None
+
+    async def _build(self, version: str, poems: list[Poem]):
+        try:
+            index = await asyncio.to_thread(build_index, version, poems)
+        except Exception as e:
+            logging.exception(f"Failed to build search index: {e}")
+            self._requested.pop(version, None)
+            return
+        finally:
+            self._builds.pop(version, None)
+        self._indexes[version] = index
+        # Least recently used first, but never the newest version's index.
+        newest = self._newest().version
+        older = [v for v in self._indexes if v != newest]
+        for evicted in older[: len(self._indexes) - self.retained]:
+            del self._indexes[evicted]
+            self._requested.pop(evicted, None)
+        self._notify()
+
+    def add_content(self, poem_id: str, lines: Iterable[str]):
+        lines = list(lines)
+        changed = False
+        for index in self._indexes.values():
+            generation = index.generation
+            index.add_content(poem_id, lines)
+            changed = changed or index.generation != generation
+        if changed:
+            self._notify()
+
+    def wait_for_update(self) -> Awaitable[bool]:
+        """Waits until an index is published or its results may have changed.
+
+        The event is taken when this is called, not when it is first awaited,
+        so a change in between isn't missed.
+        """
+        return self._updated.wait()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def close(self):
+        for task in list(self._builds.values()):
+            task.cancel()
+
+
+search_indexes = SearchIndexes()
+
+
+@contextlib.asynccontextmanager
+async def search_lifespan():
+    """Cancels index builds still running at shutdown."""
+    try:
+        yield
+    finally:
+        search_indexes.close()
@@ -1,198 +1,374 @@
 import reflex as rx
-import os
 import asyncio
+import contextlib
 import logging
-import json
-from notion_client import AsyncClient
-from typing import TypedDict, Optional
+from typing import Optional
+from reflex.state import StateUpdate
+from reflex.utils.format import json_dumps
+from reflex.vars.base import ComputedVar
+from app.bodies import get_body, save_body
+from app.images import image_path
+from app.metrics import (
+    METRICS_ENABLED,
+    computed_var_seconds,
+    delta_bytes,
+    timed,
+    timed_event,
+)
+from app.catalog import CatalogSnapshot, catalog_cache, catalog_sync
+from app.models import Poem, Stanza, summarize
+from app.notion import notion_token, stream_poem_body
+from app.prefetch import prefetcher
+from app.search import SearchIndex, search_indexes
+from app.views import BEST_MATCH, DEFAULT_SORT, SORT_OPTIONS, view_engine
 
+# The poem list is sent a page at a time, and at most this many pages at once.
+POEM_PAGE_SIZE = 30
+MAX_WINDOW_PAGES = 3
+# While searching, a session re-checks its index at least this often, and
+# waits this long after a change so a burst of bodies costs one update.
+SEARCH_WATCH_SECONDS = 60.0
+SEARCH_SETTLE_SECONDS = 0.5
 
-class Poem(TypedDict):
-    id: str
-    title: str
-    date: str
-    image_url: Optional[str]
-    excerpt: str
-    content: list[str]
+
+class TimedVar(ComputedVar):
+    """A computed var that records how long each recomputation takes.
+
+    Only the getter Reflex calls is wrapped; `_fget` stays the original
+    function, so dependency tracking still reads the var's own code.
+    """
+
+    @property
+    def fget(self):
+        return timed(computed_var_seconds, self._name, self._fget)
+
+
+timed_var = TimedVar if METRICS_ENABLED else rx.var
+
+
+@contextlib.asynccontextmanager
+async def delta_metrics_lifespan(reflex_app: rx.App):
+    """Records the size of every state delta sent to a client, per state.
+
+    Deltas flushed when a background event leaves `async with self` skip
+    middleware, but every update, however it was made, is sent through the
+    event namespace's emit_update; that is what gets measured.
+    """
+    namespace = reflex_app.event_namespace
+    emit_update = namespace.emit_update
+
+    async def measured_emit_update(update: StateUpdate, token: str):
+        for name, delta in update.delta.items():
+            size = len(json_dumps(delta).encode())
+            delta_bytes.observe(size, name.rpartition(".")[2])
+        await emit_update(update=update, token=token)
+
+    namespace.emit_update = measured_emit_update
+    try:
+        yield
+    finally:
+        namespace.emit_update = emit_update
 
 
 class PoetryState(rx.State):
     """Manages the state for the poetry collection app."""
 
-    database_id: str = "6e09b54e-712e-495a-8dd9-835da66b0e40"
-    poems: list[Poem] = []
-    preamble_poem: Optional[Poem] = None
+    catalog_version: str = ""
     is_loading: bool = True
     error_message: str = ""
-    selected_poem: Optional[Poem] = None
+    selected_poem_id: str = ""
     is_poem_loading: bool = False
     search_term: str = ""
-    sort_by: str = "Recent"
-    sort_options: list[str] = ["Recent", "Oldest First", "Title (A-Z)"]
+    sort_by: str = DEFAULT_SORT
+    sort_options: list[str] = SORT_OPTIONS
+    window_start: int = 0
+    window_end: int = POEM_PAGE_SIZE
     favorite_ids: list[str] = []
-    idle: bool = False
-    scrolled_to_bottom: bool = False
+    # The generation of the search index this session's views were built
+    # from, or 0 while it searches without one.
+    search_generation: int = 0
+    _watching_search: bool = False
 
-    @rx.event
-    def at_bottom(self):
-        """Sets the scrolled_to_bottom state to true."""
-        self.scrolled_to_bottom = True
+    def _catalog(self) -> Optional[CatalogSnapshot]:
+        """Returns the shared, read-only catalog this session is showing.
+
+        A version this worker has dropped, or never built (another worker
+        served the session), falls back to the newest snapshot rather than
+        rendering an empty list; the session's next event moves onto it.
+        """
+        catalog = catalog_cache.lookup(self.catalog_version)
+        if catalog is None and self.catalog_version:
+            catalog = catalog_cache.snapshot
+        return catalog
+
+    def _follow_catalog(self):
+        """Points the session at the newest snapshot if its own is gone."""
+        snapshot = catalog_cache.snapshot
+        if (
+            snapshot is not None
+            and self.catalog_version
+            and catalog_cache.lookup(self.catalog_version) is None
+        ):
+            self._apply_catalog(snapshot)
+
+    @timed_var
+    def preamble_poem(self) -> Optional[tuple[str, str, str]]:
+        """Returns the poem shown above the collection as its opening page."""
+        catalog = self._catalog()
+        if not catalog or not catalog.preamble:
+            return None
+        return summarize(catalog.preamble)
 
-    @rx.var
-    def _sorted_poems(self) -> list[Poem]:
-        """Returns poems in reverse of their natural order, which is the base for navigation."""
-        return self.poems[::-1]
+    @timed_var
+    def selected_poem(self) -> Optional[Poem]:
+        """Returns the catalog record of the poem being read, without its body."""
+        catalog = self._catalog()
+        if not catalog or not self.selected_poem_id:
+            return None
+        poem = catalog.get(self.selected_poem_id)
+        # Point at the local image proxy rather than Notion's expiring URL.
+        return {**poem, "image_url": image_path(poem)} if poem else None
 
-    @rx.var
+    @timed_var
     def current_poem_index(self) -> int:
         """Returns the index of the currently selected poem in the date-sorted list."""
-        if not self.selected_poem or not self.selected_poem.get("id"):
-            return -1
-        try:
-            poem_id = self.selected_poem["id"]
-            return next(
-                (i for i, p in enumerate(self._sorted_poems) if p["id"] == poem_id), -1
-            )
-        except (ValueError, KeyError) as e:
-            logging.exception(f"Error finding poem index: {e}")
+        catalog = self._catalog()
+        if not catalog or not self.selected_poem_id:
             return -1
+        return catalog.nav_index(self.selected_poem_id)
 
-    @rx.var
-    def prev_poem(self) -> Optional[Poem]:
+    @timed_var
+    def prev_poem(self) -> Optional[tuple[str, str, str]]:
         """Returns the previous poem in the date-sorted list."""
+        catalog = self._catalog()
         idx = self.current_poem_index
-        if idx > 0 and idx < len(self._sorted_poems):
-            return self._sorted_poems[idx - 1]
-        return None
+        if not catalog or idx <= 0:
+            return None
+        poem = catalog.nav_poem(idx - 1)
+        return summarize(poem) if poem else None
 
-    @rx.var
-    def next_poem(self) -> Optional[Poem]:
+    @timed_var
+    def next_poem(self) -> Optional[tuple[str, str, str]]:
         """Returns the next poem in the date-sorted list."""
+        catalog = self._catalog()
         idx = self.current_poem_index
-        if 0 <= idx < len(self._sorted_poems) - 1:
-            return self._sorted_poems[idx + 1]
-        return None
+        if not catalog or idx < 0:
+            return None
+        poem = catalog.nav_poem(idx + 1)
+        return summarize(poem) if poem else None
 
-    @rx.var
+    @timed_var
     def total_poem_count(self) -> int:
         """Returns the total number of poems."""
-        return len(self._sorted_poems)
+        catalog = self._catalog()
+        return len(catalog.poems) if catalog else 0
 
     @rx.event
     def go_to_poem(self):
         """Placeholder event for navigation. Navigation is now handled by hrefs."""
         pass
 
-    @rx.var
-    def poem_stanzas(self) -> list[str]:
-        """Groups poem content lines into stanzas."""
-        if not self.selected_poem or not self.selected_poem["content"]:
+    def _view(self) -> tuple[int, ...]:
+        """Returns catalog positions of the poems matching the search, in order."""
+        catalog = self._catalog()
+        if not catalog:
+            return ()
+        index = self._search_index() if self.search_term else None
+        return view_engine.view(catalog, self.search_term, self.sort_by, index)
+
+    def _search_index(self) -> Optional[SearchIndex]:
+        """Returns the search index this session has adopted, if any."""
+        catalog = self._catalog()
+        if catalog is None or not catalog.complete or not self.search_generation:
+            return None
+        return search_indexes.get(catalog.version, catalog.poems)
+
+    def _sync_search_index(self):
+        """Adopts the current search index, starting its build if it has none.
+
+        Indexes are built and extended in the background; changing
+        search_generation is what makes the list vars recompute against them.
+        """
+        catalog = self._catalog()
+        index = None
+        if catalog is not None and catalog.complete:
+            index = search_indexes.get(catalog.version, catalog.poems)
+        generation = index.generation if index is not None else 0
+        if self.search_generation != generation:
+            self.search_generation = generation
+
+    @timed_var
+    def filtered_count(self) -> int:
+        """Returns how many poems match the search term."""
+        return len(self._view())
+
+    @timed_var
+    def filtered_poems(self) -> list[tuple[str, str, str]]:
+        """Returns the window of filtered poems currently rendered in the list."""
+        catalog = self._catalog()
+        if not catalog:
             return []
-        stanzas = []
-        current_stanza = []
-        for line in self.selected_poem["content"]:
-            if line.strip() == "":
-                if current_stanza:
-                    stanzas.append(
-                        """
-""".join(current_stanza)
+        view = self._view()
+        start = min(self.window_start, len(view))
+        return [summarize(catalog.poems[i]) for i in view[start : self.window_end]]
+
+    @timed_var
+    def has_more_poems(self) -> bool:
+        """Whether more filtered poems follow the rendered window."""
+        return self.window_end < self.filtered_count
+
+    @timed_var
+    def has_earlier_poems(self) -> bool:
+        """Whether the window has scrolled past the first filtered poems."""
+        return 0 < self.window_start < self.filtered_count
+
+    @rx.event
+    def load_more_poems(self):
+        """Extends the window by a page, dropping the oldest page once it's full."""
+        self._follow_catalog()
+        if not self.has_more_poems:
+            return
+        self.window_end += POEM_PAGE_SIZE
+        self.window_start = max(
+            self.window_start, self.window_end - POEM_PAGE_SIZE * MAX_WINDOW_PAGES
+        )
+
+    @rx.event
+    def load_earlier_poems(self):
+        """Moves the window back by a page."""
+        self._follow_catalog()
+        self.window_start = max(0, self.window_start - POEM_PAGE_SIZE)
+        self.window_end = min(
+            self.window_end, self.window_start + POEM_PAGE_SIZE * MAX_WINDOW_PAGES
+        )
+
+    def _reset_window(self):
+        self.window_start = 0
+        self.window_end = POEM_PAGE_SIZE
+
+    @rx.event
+    def set_search_term(self, search_term: str):
+        """Updates the search term and shows the first page of results.
+
+        Clearing the term also leaves Best Match, which only ranks a query.
+        """
+        self._follow_catalog()
+        self.search_term = search_term
+        if not search_term and self.sort_by == BEST_MATCH:
+            self.sort_by = DEFAULT_SORT
+        self._reset_window()
+        if search_term:
+            self._sync_search_index()
+            return PoetryState.watch_search_index
+
+    @rx.event(background=True)
+    async def watch_search_index(self):
+        """Re-runs this session's search whenever the index behind it changes.
+
+        Without this, a search typed before the index was ready would keep
+        its substring results until the reader's next event.
+        """
+        async with self:
+            if self._watching_search or not self.search_term:
+                return
+            self._watching_search = True
+            # In case the index changed before this started waiting.
+            self._sync_search_index()
+        try:
+            while True:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(
+                        search_indexes.wait_for_update(), SEARCH_WATCH_SECONDS
                     )
-                    current_stanza = []
-            else:
-                current_stanza.append(line)
-        if current_stanza:
-            stanzas.append(
-                """
-""".join(current_stanza)
-            )
-        return stanzas
-
-    @rx.var
-    def poem_text_full(self) -> str:
-        """Returns the full poem text as a single string with newlines."""
-        return """
-
-""".join(self.poem_stanzas)
-
-    @rx.var
-    def filtered_poems(self) -> list[Poem]:
-        """Returns a list of poems filtered by search term and sorted."""
-        poems_to_filter = [
-            p
-            for p in self.poems
-            if not (self.preamble_poem and p["id"] == self.preamble_poem["id"])
-        ]
-        if self.search_term:
-            search_lower = self.search_term.lower()
-            poems_to_filter = [
-                p
-                for p in poems_to_filter
-                if search_lower in p["title"].lower()
-                or search_lower in p["excerpt"].lower()
-            ]
-        if self.sort_by == "Recent":
-            return poems_to_filter[::-1]
-        elif self.sort_by == "Oldest First":
-            return poems_to_filter
-        elif "Title" in self.sort_by:
-            return sorted(poems_to_filter, key=lambda p: p["title"], reverse=False)
-        return poems_to_filter[::-1]
-
-    @rx.var
+                await asyncio.sleep(SEARCH_SETTLE_SECONDS)
+                async with self:
+                    if not self.search_term:
+                        return
+                    self._sync_search_index()
+        finally:
+            async with self:
+                self._watching_search = False
+
+    @rx.event
+    def set_sort_by(self, sort_by: str):
+        """Updates the sort order and shows the first page of results.
+
+        Best Match without a search term would just be Recent under another
+        name, so it falls back to Recent.
+        """
+        self._follow_catalog()
+        if sort_by == BEST_MATCH and not self.search_term:
+            sort_by = DEFAULT_SORT
+        self.sort_by = sort_by
+        self._reset_window()
+
+    @timed_var
     def collection_stats(self) -> str:
         """Returns a string with collection statistics."""
-        total = len(self.poems)
-        filtered = len(self.filtered_poems)
-        if self.search_term or self.sort_by != "Recent":
+        total = self.total_poem_count
+        filtered = self.filtered_count
+        if self.search_term or self.sort_by != DEFAULT_SORT:
             return f"Showing {filtered} of {total} poems"
         return f"{total} poems in collection"
 
+    def _apply_catalog(self, snapshot: CatalogSnapshot):
+        """Points this session at a catalog snapshot if its version is new."""
+        if self.catalog_version != snapshot.version:
+            self.catalog_version = snapshot.version
+        self.is_loading = False
+        if self.search_term:
+            self._sync_search_index()
+
     @rx.event(background=True)
+    @timed_event
     async def fetch_poems(self):
         """
-        Fetch poems from the Notion database in the background.
+        Fetch poems from the shared catalog cache, which reads Notion on a miss.
         """
         async with self:
-            if not self.is_loading:
+            if not self.catalog_version:
                 self.is_loading = True
             self.error_message = ""
-        try:
-            notion_token = os.getenv("NOTION_API_KEY")
-            if not notion_token:
-                async with self:
+        if not notion_token():
+            # Without a key we can still serve the catalog restored from the store.
+            async with self:
+                if catalog_cache.snapshot is not None:
+                    self._apply_catalog(catalog_cache.snapshot)
+                else:
                     self.error_message = "NOTION_API_KEY is not set. Please add it to your environment variables."
                     self.is_loading = False
-                return
-            notion = AsyncClient(auth=notion_token)
-            db_query = await notion.databases.query(database_id=self.database_id)
-            tasks = [
-                self._process_page(notion, page) for page in db_query.get("results", [])
-            ]
-            processed_poems = await asyncio.gather(*tasks)
-            processed_poems = [p for p in processed_poems if p]
-            preamble = next(
-                (p for p in processed_poems if p["title"].lower() == "lost"), None
-            )
+            return
+        try:
+            snapshot = await catalog_cache.get(catalog_sync)
             async with self:
-                self.poems = processed_poems
-                if preamble:
-                    self.preamble_poem = preamble
-                self.is_loading = False
+                self._apply_catalog(snapshot)
+            # Keep picking up batches (or the revalidated catalog) until the
+            # refresh finishes, then apply whatever it settled on.
+            while catalog_cache.refresh_task is not None:
+                snapshot = await catalog_cache.wait_for_update()
+                async with self:
+                    self._apply_catalog(snapshot)
+            async with self:
+                self._apply_catalog(catalog_cache.snapshot)
         except Exception as e:
             logging.exception(f"Failed to fetch poems: {e}")
             async with self:
                 self.error_message = f"Failed to fetch poems: {str(e)}"
                 self.is_loading = False
 
-    @rx.event(background=True)
-    async def handle_idle(self):
-        async with self:
-            self.idle = True
-        await asyncio.sleep(5)
-        async with self:
-            self.idle = False
+
+class PoemContentState(PoetryState):
+    """Holds the body of the poem being read, apart from the collection state.
+
+    Streaming a body in only dirties this substate, so each update sends the
+    poem's stanzas and nothing from the list or navigation vars. Stanzas are
+    compiled when the body is read from Notion, so nothing is split here.
+    """
+
+    poem_stanzas: list[Stanza] = []
 
     @rx.event(background=True)
+    @timed_event
     async def fetch_poem_content(self):
         """Fetches the full content of a single poem when its page is loaded."""
         async with self:
@@ -201,39 +377,38 @@ class PoetryState(rx.State):
                 return
             self.is_poem_loading = True
             self.error_message = ""
-            self.selected_poem = None
-        if not self.poems:
-            yield PoetryState.fetch_poems
-            return
+            self.selected_poem_id = ""
+            self.poem_stanzas = []
         try:
-            notion_token = os.getenv("NOTION_API_KEY")
-            if not notion_token:
-                async with self:
-                    self.error_message = "Notion API key not configured."
-                    self.is_poem_loading = False
-                return
-            async with self:
-                poem_exists = any((p for p in self.poems if p["id"] == poem_id))
-            if not poem_exists:
+            catalog = await self._resolve_catalog(poem_id)
+            poem = catalog.get(poem_id) if catalog else None
+            if not poem:
                 async with self:
                     self.error_message = "Poem not found."
                     self.is_poem_loading = False
                 return
-            notion = AsyncClient(auth=notion_token)
-            blocks_result = await notion.blocks.children.list(block_id=poem_id)
-            content_lines = []
-            for block in blocks_result.get("results", []):
-                if block["type"] == "paragraph":
-                    text_parts = block.get("paragraph", {}).get("rich_text", [])
-                    line = "".join([t["plain_text"] for t in text_parts])
-                    content_lines.append(line)
             async with self:
-                poem_data = next((p for p in self.poems if p["id"] == poem_id), None)
-                if poem_data:
-                    poem_data["content"] = content_lines
-                    self.selected_poem = poem_data
-                else:
-                    self.error_message = "Poem disappeared during fetch."
+                self._apply_catalog(catalog)
+                self.selected_poem_id = poem_id
+            # Readers mostly go on to the next poem; start reading it now.
+            prefetcher.warm_neighbors(catalog, poem_id)
+            stanzas = await get_body(poem_id, poem["edited"])
+            if stanzas is None:
+                if not notion_token():
+                    async with self:
+                        self.error_message = "Notion API key not configured."
+                        self.is_poem_loading = False
+                    return
+                # Show the opening stanzas as soon as the first block page
+                # lands, then the rest as their pages stream in.
+                stanzas = []
+                async for stanzas in stream_poem_body(poem_id):
+                    async with self:
+                        self.poem_stanzas = stanzas
+                        self.is_poem_loading = False
+                await save_body(poem_id, poem["edited"], stanzas)
+            async with self:
+                self.poem_stanzas = list(stanzas)
                 self.is_poem_loading = False
         except Exception as e:
             logging.exception(f"Failed to fetch poem content for ID {poem_id}: {e}")
@@ -241,39 +416,15 @@ class PoetryState(rx.State):
                 self.error_message = f"A problem occurred while loading the poem."
                 self.is_poem_loading = False
 
-    async def _process_page(self, notion: AsyncClient, page: dict) -> Optional[Poem]:
-        """Helper to process a single Notion page into a Poem object."""
-        try:
-            page_id = page["id"]
-            properties = page.get("properties", {})
-            title_prop = properties.get("Title", {}).get("title", [])
-            title = title_prop[0]["plain_text"] if title_prop else "Untitled"
-            date_prop = properties.get("Date", {}).get("date", {})
-            date = date_prop.get("start", "") if date_prop else ""
-            image_prop = properties.get("Image", {}).get("files", [])
-            image_url = (
-                image_prop[0]["file"]["url"]
-                if image_prop and image_prop[0].get("file")
-                else None
-            )
-            blocks = await notion.blocks.children.list(block_id=page_id, page_size=5)
-            excerpt_lines = []
-            for block in blocks.get("results", []):
-                if block["type"] == "paragraph":
-                    text_parts = block.get("paragraph", {}).get("rich_text", [])
-                    if text_parts:
-                        excerpt_lines.append(text_parts[0]["plain_text"])
-            excerpt = (
-                " ".join(excerpt_lines[:3]) + "..." if excerpt_lines else "No content."
-            )
-            return {
-                "id": page_id,
-                "title": title,
-                "date": date,
-                "image_url": image_url,
-                "excerpt": excerpt,
-                "content": [],
-            }
-        except Exception as e:
-            logging.exception(f"Failed to process page: {e}")
-            return None
\ No newline at end of file
+    async def _resolve_catalog(self, poem_id: str) -> Optional[CatalogSnapshot]:
+        """Returns the newest catalog, waiting out a cold load until it has this poem."""
+        if not notion_token():
+            return catalog_cache.snapshot
+        catalog = await catalog_cache.get(catalog_sync)
+        while (
+            not catalog.complete
+            and catalog.get(poem_id) is None
+            and catalog_cache.refresh_task is not None
+        ):
+            catalog = await catalog_cache.wait_for_update()
+        return catalog
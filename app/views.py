@@ -0,0 +1,134 @@
+"""Filtered, sorted views of the catalog, memoized across sessions."""
+
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Iterator, Optional, Sequence
+
+from app.metrics import registry
+from app.models import Poem
+from app.search import SearchIndex
+
+VIEW_CACHE_SIZE = int(os.getenv("POETRY_VIEW_CACHE_SIZE", "512"))
+
+SORT_OPTIONS = ["Recent", "Oldest First", "Title (A-Z)", "Best Match"]
+DEFAULT_SORT = "Recent"
+# Ranked by the search index when there is a query; otherwise the default.
+BEST_MATCH = "Best Match"
+# The sort options with an order of their own, independent of any query.
+SORTED_BY = ("Recent", "Oldest First", "Title (A-Z)")
+
+
+class SortOrders(Mapping):
+    """The listed poems' positions in each sort order, preamble excluded.
+
+    Each order is computed the first time it is read, so publishing a
+    snapshot never pays for sorts nobody has asked for yet.
+    """
+
+    def __init__(self, poems: Sequence[Poem], preamble: Optional[Poem]):
+        self._poems = poems
+        self._preamble = preamble
+        self._orders: dict[str, tuple[int, ...]] = {}
+
+    def __getitem__(self, sort_by: str) -> tuple[int, ...]:
+        order = self._orders.get(sort_by)
+        if order is None:
+            if sort_by not in SORTED_BY:
+                raise KeyError(sort_by)
+            order = self._orders[sort_by] = self._compute(sort_by)
+        return order
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(SORTED_BY)
+
+    def __len__(self) -> int:
+        return len(SORTED_BY)
+
+    def _compute(self, sort_by: str) -> tuple[int, ...]:
+        if sort_by == "Oldest First":
+            poems, preamble = self._poems, self._preamble
+            return tuple(i for i, p in enumerate(poems) if p is not preamble)
+        oldest = self["Oldest First"]
+        if sort_by == "Recent":
+            return oldest[::-1]
+        return tuple(sorted(oldest, key=lambda i: self._poems[i]["title"]))
+
+
+class ViewEngine:
+    """Turns a catalog, search term and sort order into a list of positions.
+
+    Sort orders are computed once per catalog snapshot, so a view is a
+    single filtering pass over a pre-sorted order and never sorts. Views
+    are shared by every session and kept in an LRU keyed by the catalog
+    version, query, sort and search index generation.
+    """
+
+    def __init__(self, max_views: int = VIEW_CACHE_SIZE):
+        self.max_views = max_views
+        self.hits = 0
+        self.misses = 0
+        self._views: OrderedDict[tuple, tuple[int, ...]] = OrderedDict()
+
+    def view(
+        self,
+        catalog,
+        search_term: str,
+        sort_by: str,
+        index: Optional[SearchIndex] = None,
+    ) -> tuple[int, ...]:
+        """Returns positions in `catalog.poems` of the matching poems, in order."""
+        key = (
+            catalog.version,
+            search_term,
+            sort_by,
+            index.generation if index is not None else None,
+        )
+        cached = self._views.get(key)
+        if cached is not None:
+            self._views.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        positions = self._compute(catalog, search_term, sort_by, index)
+        self._views[key] = positions
+        if len(self._views) > self.max_views:
+            self._views.popitem(last=False)
+        return positions
+
+    def _compute(
+        self,
+        catalog,
+        search_term: str,
+        sort_by: str,
+        index: Optional[SearchIndex],
+    ) -> tuple[int, ...]:
+        order = catalog.orders.get(sort_by) or catalog.orders[DEFAULT_SORT]
+        if not search_term:
+            return order
+        poems = catalog.poems
+        if index is None:
+            # The index is still building: fall back to a plain substring scan.
+            needle = search_term.lower()
+            return tuple(
+                i
+                for i in order
+                if needle in poems[i]["title"].lower()
+                or needle in poems[i]["excerpt"].lower()
+            )
+        ranked = [
+            catalog.positions[poem_id]
+            for poem_id in index.search(search_term)
+            if poem_id in catalog.positions
+        ]
+        if sort_by == BEST_MATCH:
+            return tuple(i for i in ranked if poems[i] is not catalog.preamble)
+        matches = set(ranked)
+        return tuple(i for i in order if i in matches)
+
+    def stats(self) -> dict[str, int]:
+        return {"views": len(self._views), "hits": self.hits, "misses": self.misses}
+
+
+view_engine = ViewEngine()
+registry.register_stats("view_cache", view_engine.stats)
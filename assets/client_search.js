@@ -0,0 +1,289 @@
+// Filters and sorts the poem list in the browser (POETRY_CLIENT_SEARCH=1).
+//
+// The index of titles and excerpts from /_index/<version> is fetched once
+// per catalog version, when the search box is first used. Every keystroke
+// and sort change then runs here and renders into #client-results, which
+// replaces the server-rendered list while a search or sort is active. Once
+// typing pauses, a single /_search request adds poems whose full text
+// matches; only the server has their bodies indexed.
+(function () {
+  "use strict";
+
+  const PAGE_SIZE = 30;
+  const DEBOUNCE_MS = 400;
+  const MIN_SERVER_QUERY = 3;
+  // Mirror app/search.py, so poems rank here as they do on the server.
+  const TITLE_WEIGHT = 8;
+  const EXCERPT_WEIGHT = 2;
+  const EXACT_MATCH_BOOST = 1.5;
+  const DEFAULT_SORT = "Recent";
+  const BEST_MATCH = "Best Match";
+
+  let index = null;
+  let pending = null;
+  let query = "";
+  let sortBy = DEFAULT_SORT;
+  let results = [];
+  let shown = 0;
+  let server = { version: null, query: "", ids: [] };
+  let timer = null;
+
+  function root() {
+    return document.getElementById("client-results");
+  }
+
+  function tokenize(text) {
+    return (
+      text
+        .normalize("NFKD")
+        .replace(/\p{M}/gu, "")
+        .toLowerCase()
+        .match(/[\p{L}\p{N}_]+/gu) || []
+    );
+  }
+
+  function load() {
+    const el = root();
+    const version = el && el.dataset.version;
+    if (!version || (index && index.version === version)) {
+      return Promise.resolve(index);
+    }
+    if (pending && pending.version === version) {
+      return pending.promise;
+    }
+    const promise = fetch(`${el.dataset.backend}/_index/${version}`)
+      .then((response) => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        return response.json();
+      })
+      .then((data) => {
+        index = {
+          version: data.version,
+          poems: data.poems.map(([id, title, date, titleTokens, excerptTokens]) => ({
+            id,
+            title,
+            date,
+            titleTokens: titleTokens ? titleTokens.split(" ") : [],
+            excerptTokens: excerptTokens ? excerptTokens.split(" ") : [],
+          })),
+        };
+        index.positions = new Map(index.poems.map((poem, i) => [poem.id, i]));
+        return index;
+      })
+      .catch((error) => {
+        console.error("Failed to load the search index", error);
+        return index;
+      })
+      .finally(() => {
+        if (pending && pending.promise === promise) pending = null;
+      });
+    pending = { version, promise };
+    return promise;
+  }
+
+  function tokenScore(tokens, token, weight) {
+    let score = 0;
+    for (const word of tokens) {
+      if (word.startsWith(token)) {
+        score += weight * (word === token ? EXACT_MATCH_BOOST : 1);
+      }
+    }
+    return score;
+  }
+
+  function score(poem, tokens) {
+    let total = 0;
+    for (const token of tokens) {
+      const match =
+        tokenScore(poem.titleTokens, token, TITLE_WEIGHT) +
+        tokenScore(poem.excerptTokens, token, EXCERPT_WEIGHT);
+      if (!match) return 0;
+      total += match;
+    }
+    return total;
+  }
+
+  function compute() {
+    const poems = index.poems;
+    const tokens = tokenize(query);
+    const scores = new Map();
+    if (tokens.length) {
+      poems.forEach((poem, i) => {
+        const s = score(poem, tokens);
+        if (s) scores.set(i, s);
+      });
+      if (server.version === index.version && server.query === query) {
+        // Matches only in the body: after every title or excerpt match.
+        server.ids.forEach((id, rank) => {
+          const i = index.positions.get(id);
+          if (i !== undefined && !scores.has(i)) scores.set(i, -rank - 1);
+        });
+      }
+    }
+    const matches = tokens.length ? [...scores.keys()] : poems.map((_, i) => i);
+    if (sortBy === BEST_MATCH && tokens.length) {
+      matches.sort((a, b) => {
+        const sa = scores.get(a);
+        const sb = scores.get(b);
+        if (sa > 0 && sb > 0) return sb - sa || a - b;
+        return sb - sa;
+      });
+    } else if (sortBy === "Title (A-Z)") {
+      matches.sort((a, b) =>
+        poems[a].title < poems[b].title ? -1 : poems[a].title > poems[b].title ? 1 : a - b
+      );
+    } else if (sortBy === "Oldest First") {
+      matches.sort((a, b) => a - b);
+    } else {
+      matches.sort((a, b) => b - a);
+    }
+    results = matches;
+  }
+
+  function arrowIcon() {
+    const ns = "http://www.w3.org/2000/svg";
+    const svg = document.createElementNS(ns, "svg");
+    for (const [name, value] of Object.entries({
+      width: "24",
+      height: "24",
+      viewBox: "0 0 24 24",
+      fill: "none",
+      stroke: "currentColor",
+      "stroke-width": "2",
+      "stroke-linecap": "round",
+      "stroke-linejoin": "round",
+      class:
+        "text-gray-600 opacity-0 group-hover:opacity-100 transition-opacity duration-300",
+    })) {
+      svg.setAttribute(name, value);
+    }
+    for (const d of ["M5 12h14", "m12 5 7 7-7 7"]) {
+      const path = document.createElementNS(ns, "path");
+      path.setAttribute("d", d);
+      svg.append(path);
+    }
+    return svg;
+  }
+
+  // Matches poem_card in app/components.py.
+  function card(poem) {
+    const link = document.createElement("a");
+    link.href = `/poem/${poem.id}`;
+    link.className =
+      "w-full flex items-center justify-between py-6 border-b border-white/5 transition-all duration-300 ease-in-out group poem-fade-in";
+    const text = document.createElement("div");
+    text.className = "flex-1";
+    const title = document.createElement("h3");
+    title.className =
+      "text-2xl font-['Fraunces'] text-[#EAE6DF] group-hover:text-white transition-colors duration-300";
+    title.textContent = poem.title;
+    const date = document.createElement("p");
+    date.className = "text-sm text-gray-600 font-['Inter'] mt-1";
+    date.textContent = poem.date;
+    text.append(title, date);
+    link.append(text, arrowIcon());
+    return link;
+  }
+
+  function emptyMessage() {
+    const box = document.createElement("div");
+    box.className =
+      "flex flex-col items-center justify-center text-center bg-black/20 p-12 rounded-2xl";
+    const heading = document.createElement("h2");
+    heading.className = "text-2xl font-bold mt-4 text-gray-300";
+    heading.textContent = "No Poems Found";
+    const hint = document.createElement("p");
+    hint.className = "text-gray-500 mt-2";
+    hint.textContent = "Try adjusting your search or filter.";
+    box.append(heading, hint);
+    return box;
+  }
+
+  // Best Match only ranks a query; without one it falls back to Recent, as
+  // PoetryState.set_sort_by does on the server.
+  function checkSort() {
+    if (sortBy !== BEST_MATCH || query !== "") return;
+    sortBy = DEFAULT_SORT;
+    const select = document.getElementById("poem-sort");
+    if (select) select.value = DEFAULT_SORT;
+  }
+
+  function active() {
+    return index !== null && (query !== "" || sortBy !== DEFAULT_SORT);
+  }
+
+  function render() {
+    const el = root();
+    if (!el) return;
+    document.body.dataset.clientSearch = active() ? "active" : "";
+    el.replaceChildren();
+    shown = 0;
+    if (!active()) return;
+    if (!results.length) {
+      el.append(emptyMessage());
+      return;
+    }
+    showMore();
+  }
+
+  function showMore() {
+    const el = root();
+    if (!el || !active() || shown >= results.length) return;
+    const end = Math.min(results.length, shown + PAGE_SIZE);
+    for (let i = shown; i < end; i++) el.append(card(index.poems[results[i]]));
+    shown = end;
+  }
+
+  function update() {
+    load().then((loaded) => {
+      if (!loaded) return;
+      compute();
+      render();
+    });
+  }
+
+  function searchServer() {
+    const el = root();
+    const term = query;
+    if (!el || !index || tokenize(term).join("").length < MIN_SERVER_QUERY) return;
+    const version = index.version;
+    const params = new URLSearchParams({ v: version, q: term });
+    fetch(`${el.dataset.backend}/_search?${params}`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data) => {
+        if (!data || !data.ready || term !== query) return;
+        server = { version: data.version, query: term, ids: data.ids };
+        update();
+      })
+      .catch((error) => console.error("Full-text search failed", error));
+  }
+
+  document.addEventListener("focusin", (event) => {
+    if (event.target.id === "poem-search") load();
+  });
+
+  document.addEventListener("input", (event) => {
+    if (event.target.id !== "poem-search") return;
+    query = event.target.value.trim();
+    checkSort();
+    update();
+    clearTimeout(timer);
+    timer = setTimeout(searchServer, DEBOUNCE_MS);
+  });
+
+  document.addEventListener("change", (event) => {
+    if (event.target.id !== "poem-sort") return;
+    sortBy = event.target.value;
+    checkSort();
+    update();
+  });
+
+  window.addEventListener(
+    "scroll",
+    () => {
+      const remaining = document.body.offsetHeight - (window.innerHeight + window.scrollY);
+      if (remaining < window.innerHeight) showMore();
+    },
+    { passive: true }
+  );
+})();
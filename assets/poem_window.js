@@ -0,0 +1,90 @@
+// Scroll-driven loading for the windowed poem list (app/components.py).
+//
+// The "Show more poems" button is a normal Reflex event trigger, so instead
+// of calling into Reflex directly this clicks it once it comes within a
+// screen of the viewport. Reflex then runs PoetryState.load_more_poems.
+//
+// Moving the window adds poems at one end and may drop a page at the
+// other. Before any window button is clicked, the first visible poem is
+// remembered, and once the list re-renders the page is scrolled so that
+// poem stays where it was, rather than jumping by the dropped page.
+(function () {
+  "use strict";
+
+  const LIST = "poem-window";
+  const MORE = '[data-window="more"]';
+  const ANCHOR_MS = 1000;
+  const BUSY_MS = 3000;
+
+  let anchor = null;
+  let anchorTimer;
+  let busy = false;
+  let busyTimer;
+  let scheduled = false;
+
+  function cards() {
+    const list = document.getElementById(LIST);
+    return list ? list.querySelectorAll('a[href^="/poem/"]') : [];
+  }
+
+  function remember() {
+    for (const card of cards()) {
+      const top = card.getBoundingClientRect().top;
+      if (top >= 0) {
+        anchor = { href: card.getAttribute("href"), top };
+        break;
+      }
+    }
+    clearTimeout(anchorTimer);
+    anchorTimer = setTimeout(() => (anchor = null), ANCHOR_MS);
+  }
+
+  function restore() {
+    if (!anchor) return;
+    for (const card of cards()) {
+      if (card.getAttribute("href") === anchor.href) {
+        const shift = card.getBoundingClientRect().top - anchor.top;
+        if (shift) window.scrollBy(0, shift);
+        return;
+      }
+    }
+  }
+
+  function loadMore() {
+    scheduled = false;
+    const button = document.querySelector(MORE);
+    if (!button || busy || document.body.dataset.clientSearch === "active") return;
+    if (button.getBoundingClientRect().top > window.innerHeight * 2) return;
+    busy = true;
+    clearTimeout(busyTimer);
+    busyTimer = setTimeout(() => (busy = false), BUSY_MS);
+    button.click();
+  }
+
+  function scheduleLoad() {
+    if (!scheduled) {
+      scheduled = true;
+      requestAnimationFrame(loadMore);
+    }
+  }
+
+  document.addEventListener(
+    "click",
+    (event) => {
+      if (event.target.closest("[data-window]")) remember();
+    },
+    true
+  );
+
+  new MutationObserver((mutations) => {
+    if (!mutations.some((m) => m.target.closest && m.target.closest("#" + LIST))) {
+      return;
+    }
+    restore();
+    // The window moved: allow the next load, in case the list is still short.
+    busy = false;
+    scheduleLoad();
+  }).observe(document.body, { childList: true, subtree: true });
+
+  window.addEventListener("scroll", scheduleLoad, { passive: true });
+})();
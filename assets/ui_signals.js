@@ -0,0 +1,42 @@
+// Cosmetic UI flags kept entirely in the browser.
+//
+// Each flag is a data attribute on <html>, and assets/style.css shows or
+// hides the elements that depend on it, so none of them ever reaches the
+// server:
+//
+//   data-idle              set for IDLE_SHOW_MS after IDLE_AFTER_MS without
+//                          a mouse move or key press ("be still.")
+//   data-scrolled-to-bottom  set once the page has been scrolled to its end
+//                          ("Thank you for staying.")
+(function () {
+  "use strict";
+
+  const IDLE_AFTER_MS = 30000;
+  const IDLE_SHOW_MS = 5000;
+  const BOTTOM_MARGIN = 50;
+
+  const flags = document.documentElement.dataset;
+  let idleTimer;
+  let showTimer;
+
+  function becomeIdle() {
+    flags.idle = "true";
+    clearTimeout(showTimer);
+    showTimer = setTimeout(() => delete flags.idle, IDLE_SHOW_MS);
+  }
+
+  function resetIdle() {
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(becomeIdle, IDLE_AFTER_MS);
+  }
+
+  function checkBottom() {
+    const remaining = document.body.offsetHeight - (window.innerHeight + window.scrollY);
+    if (remaining <= BOTTOM_MARGIN) flags.scrolledToBottom = "true";
+  }
+
+  document.addEventListener("mousemove", resetIdle, { passive: true });
+  document.addEventListener("keypress", resetIdle);
+  window.addEventListener("scroll", checkBottom, { passive: true });
+  resetIdle();
+})();
@@ -0,0 +1,317 @@
+"""A local stand-in for the parts of the Notion API the app reads.
+
+Serves a synthetic poem database of any size over plain HTTP, with
+configurable latency and rate limiting, so the app can be benchmarked
+without an API key. Point the app at it with NOTION_BASE_URL.
+
+    python -m bench.fake_notion --poems 1000 --latency 0.05 --port 8765
+
+Besides the Notion routes, GET /_stats returns the requests served per
+route and POST /_reset clears the counters.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+DATABASE_ID = "00000000-0000-4000-8000-000000000000"
+MAX_PAGE_SIZE = 100
+
+WORDS = (
+    "moon silver river quiet morning ash window rain harbor lantern salt "
+    "orchard winter ember hollow thread meadow sparrow tide stone bell "
+    "linen dusk field mirror cedar smoke glass wheat shore hymn lost"
+).split()
+
+EPOCH = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class FakeConfig:
+    poems: int = 1000
+    blocks: int = 24
+    latency: float = 0.05
+    jitter: float = 0.0
+    # Requests per second before answering 429; 0 disables the limit.
+    rate_limit: float = 0.0
+    # Chance of answering any request with a 429 regardless of the limit.
+    throttle: float = 0.0
+    retry_after: float = 1.0
+    images: float = 0.5
+    seed: int = 0
+
+
+class FakeDatabase:
+    """Generates the same synthetic poems, pages and blocks for a given seed."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        rng = random.Random(config.seed)
+        self.pages = [self._page(i, rng) for i in range(config.poems)]
+        self.by_id = {page["id"]: page for page in self.pages}
+
+    def _page(self, i: int, rng: random.Random) -> dict:
+        # The database always holds one preamble poem, as the real one does.
+        title = "lost" if i == 0 else " ".join(rng.sample(WORDS, rng.randint(1, 4)))
+        date = EPOCH + timedelta(days=i)
+        image = (
+            [{"name": "image.jpg", "file": {"url": f"http://images.invalid/{i}.jpg"}}]
+            if rng.random() < self.config.images
+            else []
+        )
+        return {
+            "object": "page",
+            "id": poem_id(i),
+            # Minutes apart, so even the largest catalogs were edited in the past.
+            "last_edited_time": edited_time(EPOCH + timedelta(minutes=i)),
+            "archived": False,
+            "in_trash": False,
+            "properties": {
+                "Title": {"title": [{"plain_text": title.capitalize()}]},
+                "Date": {"date": {"start": date.date().isoformat()}},
+                "Image": {"files": image},
+            },
+        }
+
+    def query(self, body: dict) -> dict:
+        pages = self.pages
+        since = (body.get("filter") or {}).get("last_edited_time", {})
+        if "on_or_after" in since:
+            pages = [p for p in pages if p["last_edited_time"] >= since["on_or_after"]]
+        return paginate(pages, body.get("start_cursor"), body.get("page_size"))
+
+    def blocks(self, block_id: str, params: dict[str, str]) -> Optional[dict]:
+        page = self.by_id.get(block_id)
+        if page is None:
+            return None
+        rng = random.Random(block_id)
+        blocks = [self._block(block_id, n, rng) for n in range(self.config.blocks)]
+        return paginate(blocks, params.get("start_cursor"), params.get("page_size"))
+
+    def _block(self, parent: str, n: int, rng: random.Random) -> dict:
+        # Five lines to a stanza, with a blank paragraph between stanzas.
+        text = "" if n % 6 == 5 else " ".join(rng.choices(WORDS, k=rng.randint(3, 8)))
+        rich_text = [
+            {
+                "type": "text",
+                "plain_text": text,
+                "annotations": {"italic": n % 6 == 0, "color": "default"},
+                "href": None,
+            }
+        ]
+        return {
+            "object": "block",
+            "id": f"{parent[:-4]}{n:04d}",
+            "type": "paragraph",
+            "has_children": False,
+            "paragraph": {"rich_text": rich_text if text else []},
+        }
+
+
+def poem_id(i: int) -> str:
+    return f"{i:08x}-0000-4000-8000-{i:012x}"
+
+
+def edited_time(date: datetime) -> str:
+    return date.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+def paginate(items: list, cursor: Optional[str], page_size: Any) -> dict:
+    start = int(cursor or 0)
+    size = min(int(page_size or MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+    end = start + size
+    return {
+        "object": "list",
+        "results": items[start:end],
+        "has_more": end < len(items),
+        "next_cursor": str(end) if end < len(items) else None,
+    }
+
+
+def error(status: int, code: str, message: str) -> dict:
+    return {"object": "error", "status": status, "code": code, "message": message}
+
+
+class FakeNotion:
+    """Answers Notion API requests from a FakeDatabase, one HTTP/1.1 connection each."""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.database = FakeDatabase(config)
+        self.requests: Counter[str] = Counter()
+        self.throttled = 0
+        self._rng = random.Random(config.seed)
+        self._tokens = config.rate_limit
+        self._updated = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "total": sum(self.requests.values()),
+            "throttled": self.throttled,
+        }
+
+    def _rate_limited(self) -> bool:
+        if self.config.throttle and self._rng.random() < self.config.throttle:
+            return True
+        if not self.config.rate_limit:
+            return False
+        now = time.monotonic()
+        self._tokens = min(
+            self.config.rate_limit,
+            self._tokens + (now - self._updated) * self.config.rate_limit,
+        )
+        self._updated = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    async def handle(
+        self, method: str, target: str, body: bytes
+    ) -> tuple[int, dict, dict[str, str]]:
+        """Returns (status, JSON payload, extra headers) for one request."""
+        url = urlsplit(target)
+        parts = url.path.strip("/").split("/")
+        if parts == ["_stats"]:
+            return 200, self.stats(), {}
+        if parts == ["_reset"] and method == "POST":
+            self.requests.clear()
+            self.throttled = 0
+            return 200, {}, {}
+        route = route_name(method, parts)
+        if route is None:
+            return 404, error(404, "object_not_found", "Unknown route"), {}
+        self.requests[route] += 1
+        delay = self.config.latency + self._rng.uniform(0, self.config.jitter)
+        await asyncio.sleep(delay)
+        if self._rate_limited():
+            self.throttled += 1
+            headers = {"Retry-After": f"{self.config.retry_after:g}"}
+            return 429, error(429, "rate_limited", "Slow down"), headers
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if route == "databases.query":
+            return 200, self.database.query(json.loads(body or b"{}")), {}
+        if route == "blocks.children.list":
+            result = self.database.blocks(parts[2], params)
+        else:
+            result = self.database.by_id.get(parts[2])
+        if result is None:
+            return 404, error(404, "object_not_found", "No such object"), {}
+        return 200, result, {}
+
+    async def serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    return
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                status, payload, extra = await self.handle(method, target, body)
+                data = json.dumps(payload).encode()
+                head = [
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(data)}",
+                    *(f"{k}: {v}" for k, v in extra.items()),
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def route_name(method: str, parts: list[str]) -> Optional[str]:
+    if len(parts) == 4 and parts[:2] == ["v1", "databases"] and parts[3] == "query":
+        return "databases.query" if method == "POST" else None
+    if len(parts) == 4 and parts[:2] == ["v1", "blocks"] and parts[3] == "children":
+        return "blocks.children.list" if method == "GET" else None
+    if len(parts) == 3 and parts[:2] == ["v1", "pages"]:
+        return "pages.retrieve" if method == "GET" else None
+    return None
+
+
+async def serve(config: FakeConfig, host: str = "127.0.0.1", port: int = 0):
+    """Serves a fake Notion forever, printing its base URL once it's listening."""
+    fake = FakeNotion(config)
+    server = await asyncio.start_server(fake.serve_connection, host, port)
+    bound = server.sockets[0].getsockname()[1]
+    print(f"http://{host}:{bound}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--poems", type=int, default=FakeConfig.poems)
+    parser.add_argument(
+        "--blocks", type=int, default=FakeConfig.blocks, help="blocks per poem"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=FakeConfig.latency, help="seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=FakeConfig.jitter, help="extra random delay"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=FakeConfig.rate_limit,
+        help="requests per second before answering 429 (0 for none)",
+    )
+    parser.add_argument(
+        "--throttle",
+        type=float,
+        default=FakeConfig.throttle,
+        help="chance of a 429 on any request",
+    )
+    parser.add_argument("--retry-after", type=float, default=FakeConfig.retry_after)
+    parser.add_argument(
+        "--images", type=float, default=FakeConfig.images, help="share with an image"
+    )
+    parser.add_argument("--seed", type=int, default=FakeConfig.seed)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    config = FakeConfig(
+        poems=args.poems,
+        blocks=args.blocks,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        throttle=args.throttle,
+        retry_after=args.retry_after,
+        images=args.images,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(serve(config, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Measures one catalog size against a running fake Notion; prints JSON results.
+
+Run through bench/run.py, which starts the fake server and sets the
+environment (NOTION_BASE_URL, NOTION_API_KEY, a scratch POETRY_SNAPSHOT_PATH)
+before this process imports the app. List and search measurements drive
+real PoetryState sessions, outside any server, and size the state delta
+Reflex would send after each event.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import Any, Optional
+
+import httpx
+from reflex.state import State
+from reflex.utils.format import json_dumps
+
+from app.bodies import body_cache, get_body, save_body
+from app.catalog import CatalogSnapshot, catalog_cache, catalog_sync
+from app.models import summarize
+from app.notion import NOTION_BASE_URL, close_client, flight, stream_poem_body
+from app.scheduler import scheduler
+from app.search import search_indexes
+from app.state import MAX_WINDOW_PAGES, PoetryState
+
+QUERY = "silver moon"
+
+
+def summary(samples: list[float]) -> dict[str, float]:
+    """Returns the distribution of a list of durations in seconds, in ms."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3
+        ),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def json_size(value: Any) -> int:
+    return len(json.dumps(value, separators=(",", ":")).encode())
+
+
+def new_session() -> tuple[State, PoetryState]:
+    """Returns a fresh session's root state and PoetryState, already synced."""
+    root = State(_reflex_internal_init=True)
+    session = root.get_substate(PoetryState.get_full_name().split(".")[1:])
+    take_delta(root)
+    return root, session
+
+
+def take_delta(root: State) -> int:
+    """Computes the delta Reflex would send now, marks it sent, returns its size."""
+    delta = root.get_delta()
+    root._clean()
+    return len(json_dumps(delta).encode())
+
+
+class FakeStats:
+    """Reads the fake server's request counters."""
+
+    def __init__(self, base_url: str):
+        self.http = httpx.AsyncClient(base_url=base_url)
+
+    async def reset(self):
+        await self.http.post("/_reset")
+
+    async def read(self) -> dict:
+        return (await self.http.get("/_stats")).json()
+
+    async def close(self):
+        await self.http.aclose()
+
+
+async def measure_catalog(fake: FakeStats) -> dict[str, Any]:
+    """Times a cold catalog load, as fetch_poems sees it, then a warm refresh."""
+    await fake.reset()
+    retries = scheduler.retries
+    start = time.perf_counter()
+    snapshot = await catalog_cache.get(catalog_sync)
+    first_batch = time.perf_counter() - start
+    publishes = 1
+    while catalog_cache.refresh_task is not None:
+        await catalog_cache.wait_for_update()
+        publishes += 1
+    complete = time.perf_counter() - start
+    cold = await fake.read()
+    snapshot = catalog_cache.snapshot
+
+    # Force the next read to revalidate; it runs as an incremental sync.
+    await fake.reset()
+    catalog_cache.ttl = 0
+    start = time.perf_counter()
+    await catalog_cache.refresh(catalog_sync)
+    refresh = time.perf_counter() - start
+    catalog_cache.ttl = float("inf")
+    warm = await fake.read()
+    return {
+        "poems": len(snapshot.poems),
+        "first_batch_ms": round(first_batch * 1000, 3),
+        "complete_ms": round(complete * 1000, 3),
+        "publishes": publishes,
+        "requests": cold["requests"],
+        "requests_total": cold["total"],
+        "throttled": cold["throttled"],
+        "retries": scheduler.retries - retries,
+        "refresh_ms": round(refresh * 1000, 3),
+        "refresh_requests_total": warm["total"],
+    }
+
+
+async def measure_content(
+    fake: FakeStats, catalog: CatalogSnapshot, samples: int
+) -> dict[str, Any]:
+    """Times opening poems cold, from the shared store and from memory."""
+    step = max(1, len(catalog.poems) // samples)
+    poems = catalog.poems[::step][:samples]
+    await fake.reset()
+    first, cold, stored, memory, sizes = [], [], [], [], []
+    for poem in poems:
+        # What fetch_poem_content does on a miss: stream, then save.
+        start = time.perf_counter()
+        first_at = None
+        stanzas = []
+        async for stanzas in stream_poem_body(poem["id"]):
+            first_at = first_at or time.perf_counter()
+        first.append((first_at or time.perf_counter()) - start)
+        await save_body(poem["id"], poem["edited"], stanzas)
+        cold.append(time.perf_counter() - start)
+        sizes.append(json_size({"poem_stanzas": stanzas}))
+
+        body_cache._drop(poem["id"])
+        start = time.perf_counter()
+        await get_body(poem["id"], poem["edited"])
+        stored.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await get_body(poem["id"], poem["edited"])
+        memory.append(time.perf_counter() - start)
+    stats = await fake.read()
+    return {
+        "first_stanzas": summary(first),
+        "cold": summary(cold),
+        "store": summary(stored),
+        "memory": summary(memory),
+        "requests_per_poem": round(stats["total"] / max(1, len(poems)), 2),
+        "delta_bytes_mean": round(statistics.fmean(sizes)) if sizes else 0,
+    }
+
+
+def type_query(catalog: CatalogSnapshot) -> tuple[list[float], list[int]]:
+    """Types QUERY into a new session a key at a time, timing each delta."""
+    root, session = new_session()
+    session._apply_catalog(catalog)
+    take_delta(root)
+    times, sizes = [], []
+    for n in range(1, len(QUERY) + 1):
+        start = time.perf_counter()
+        session.set_search_term(QUERY[:n])
+        sizes.append(take_delta(root))
+        times.append(time.perf_counter() - start)
+    return times, sizes
+
+
+async def measure_keystrokes(catalog: CatalogSnapshot) -> dict[str, Any]:
+    """Times per-keystroke filtering with and without the search index."""
+    # The index build this starts can't run until the loop gets control back,
+    # so every keystroke here takes the substring-scan fallback.
+    scan, sizes = type_query(catalog)
+    start = time.perf_counter()
+    while search_indexes.get(catalog.version, catalog.poems) is None:
+        await asyncio.sleep(0.005)
+    index_build = time.perf_counter() - start
+    indexed, _ = type_query(catalog)
+    # A third session typing the same query is served from the view cache.
+    cached, _ = type_query(catalog)
+    return {
+        "query": QUERY,
+        "scan": summary(scan),
+        "index_build_ms": round(index_build * 1000, 3),
+        "index": summary(indexed),
+        "cached": summary(cached),
+        "delta_bytes_max": max(sizes),
+        "delta_bytes_mean": round(statistics.fmean(sizes)),
+    }
+
+
+def measure_payloads(catalog: CatalogSnapshot) -> dict[str, Any]:
+    """Sizes the deltas for loading the catalog and paging through the list."""
+    root, session = new_session()
+    session._apply_catalog(catalog)
+    loaded = take_delta(root)
+    # Scroll until the window holds its most pages; the last page shifts it.
+    scrolled = 0
+    for _ in range(MAX_WINDOW_PAGES):
+        session.load_more_poems()
+        scrolled = take_delta(root)
+    return {
+        "catalog_loaded_bytes": loaded,
+        "full_window_bytes": scrolled,
+        "all_summaries_bytes": len(
+            json_dumps([summarize(p) for p in catalog.poems]).encode()
+        ),
+    }
+
+
+async def measure(samples: int) -> dict[str, Any]:
+    fake = FakeStats(NOTION_BASE_URL)
+    try:
+        results = {"catalog": await measure_catalog(fake)}
+        catalog = catalog_cache.snapshot
+        results["content"] = await measure_content(fake, catalog, samples)
+        results["keystroke"] = await measure_keystrokes(catalog)
+        results["payload"] = measure_payloads(catalog)
+        results["single_flight"] = flight.stats()
+        return results
+    finally:
+        await fake.close()
+        await close_client()
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args(argv)
+    results = asyncio.run(measure(args.samples))
+    sys.stdout.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
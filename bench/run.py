@@ -0,0 +1,185 @@
+"""Benchmarks the app against a local fake Notion across catalog sizes.
+
+    python -m bench.run --sizes 10,1000,50000 --output before.json
+    python -m bench.run --sizes 10,1000,50000 --baseline before.json
+
+Each size gets its own fake server (bench/fake_notion.py) and a fresh
+app process (bench/measure.py) with a scratch store, so no cache carries
+over between sizes. Results are written as JSON; with --baseline, every
+numeric result is also printed next to the earlier run's. Large sizes
+fetch one excerpt per poem, so they take minutes at realistic latencies.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from typing import Any, Optional
+
+from bench.fake_notion import DATABASE_ID, FakeConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = "10,100,1000,10000,50000"
+
+
+def start_server(args: argparse.Namespace, poems: int) -> tuple[subprocess.Popen, str]:
+    """Starts a fake Notion holding `poems` poems; returns it and its base URL."""
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "bench.fake_notion",
+            f"--poems={poems}",
+            f"--blocks={args.blocks}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--rate-limit={args.rate_limit}",
+            f"--throttle={args.throttle}",
+            f"--retry-after={args.retry_after}",
+            f"--seed={args.seed}",
+        ],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = server.stdout.readline().strip()
+    if not url:
+        server.kill()
+        raise RuntimeError("The fake Notion server failed to start")
+    return server, url
+
+
+def run_size(args: argparse.Namespace, poems: int) -> dict[str, Any]:
+    server, url = start_server(args, poems)
+    try:
+        with tempfile.TemporaryDirectory() as scratch:
+            env = {
+                **os.environ,
+                "NOTION_API_KEY": "bench",
+                "NOTION_BASE_URL": url,
+                "NOTION_DATABASE_ID": DATABASE_ID,
+                "POETRY_CACHE_URL": "",
+                "POETRY_SNAPSHOT_PATH": os.path.join(scratch, "poetry.sqlite3"),
+                "POETRY_IMAGE_DIR": os.path.join(scratch, "images"),
+                "POETRY_PREFETCH": "0",
+                "POETRY_NOTION_RATE": str(args.notion_rate),
+                "POETRY_NOTION_BURST": str(args.notion_burst),
+                "POETRY_NOTION_CONCURRENCY": str(args.notion_concurrency),
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "bench.measure", f"--samples={args.samples}"],
+                cwd=ROOT,
+                env=env,
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True,
+            ).stdout
+    finally:
+        server.terminate()
+        server.wait()
+    # Reflex can print config warnings first; the results are the last line.
+    return {"poems": poems, **json.loads(output.splitlines()[-1])}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    """Returns every numeric leaf of a result, keyed by its dotted path."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+    """Lines listing each result beside its baseline, for sizes both runs have."""
+    before = {r["poems"]: flatten(r) for r in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        old = before.get(result["poems"])
+        if old is None:
+            continue
+        for key, value in flatten(result).items():
+            if key not in old or key == "poems":
+                continue
+            change = f"{(value - old[key]) / old[key]:+.1%}" if old[key] else "n/a"
+            lines.append(
+                f"{result['poems']:>6} {key:<40} {old[key]:>12g} {value:>12g} {change:>8}"
+            )
+    return lines
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", default=DEFAULT_SIZES, help="comma-separated poem counts"
+    )
+    parser.add_argument("--samples", type=int, default=20, help="poems opened per size")
+    parser.add_argument("--blocks", type=int, default=FakeConfig.blocks)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--rate-limit", type=float, default=FakeConfig.rate_limit)
+    parser.add_argument("--throttle", type=float, default=FakeConfig.throttle)
+    parser.add_argument("--retry-after", type=float, default=FakeConfig.retry_after)
+    parser.add_argument("--seed", type=int, default=FakeConfig.seed)
+    parser.add_argument(
+        "--notion-rate",
+        type=float,
+        default=1000,
+        help="the app's own request rate limit (the real API allows 3/s)",
+    )
+    parser.add_argument("--notion-burst", type=int, default=100)
+    parser.add_argument("--notion-concurrency", type=int, default=4)
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--baseline", help="an earlier results file to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    results = []
+    for poems in (int(size) for size in args.sizes.split(",")):
+        print(f"Benchmarking {poems} poems...", file=sys.stderr, flush=True)
+        results.append(run_size(args, poems))
+    report = {
+        "meta": {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k != "baseline"},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("\n".join(compare(baseline, report)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
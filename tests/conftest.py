@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The shared store is opened when app.backends is imported; point it at a
+# scratch file before any test module imports the app.
+_scratch = tempfile.mkdtemp(prefix="poetry-tests-")
+os.environ.setdefault("POETRY_SNAPSHOT_PATH", os.path.join(_scratch, "poetry.sqlite3"))
+os.environ.setdefault("POETRY_IMAGE_DIR", os.path.join(_scratch, "images"))
+os.environ["POETRY_CACHE_URL"] = ""
+os.environ.pop("NOTION_API_KEY", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+"""A small in-memory stand-in for a Redis server, for testing RedisBackend.
+
+It speaks just enough RESP2 for the commands the backend sends, and runs
+the backend's two lease scripts natively instead of interpreting Lua.
+"""
+
+import socketserver
+import threading
+import time
+from typing import Any, Optional
+
+from app.backends import ACQUIRE_SCRIPT, RELEASE_SCRIPT
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, password: Optional[str] = None):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.password = password
+        self.strings: dict[str, tuple[str, Optional[float]]] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.commands: list[str] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def __enter__(self) -> "RespStandIn":
+        threading.Thread(
+            target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        ).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def get(self, key: str) -> Optional[str]:
+        value, expires = self.strings.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.strings[key]
+            return None
+        return value
+
+    def set(self, key: str, value: str, px: Optional[int] = None):
+        expires = time.monotonic() + px / 1000 if px is not None else None
+        self.strings[key] = (value, expires)
+
+    def run(self, name: str, args: list[str]) -> Any:
+        self.commands.append(name)
+        if name == "AUTH":
+            if args[-1] != self.password:
+                raise ValueError("WRONGPASS invalid password")
+            return "OK"
+        if name == "SELECT":
+            return "OK"
+        if name == "GET":
+            return self.get(args[0])
+        if name == "SET":
+            px = int(args[3]) if len(args) > 3 and args[2].upper() == "PX" else None
+            self.set(args[0], args[1], px)
+            return "OK"
+        if name == "DEL":
+            return int(self.strings.pop(args[0], None) is not None)
+        if name == "HSET":
+            self.hashes.setdefault(args[0], {})[args[1]] = args[2]
+            return 1
+        if name == "HGET":
+            return self.hashes.get(args[0], {}).get(args[1])
+        if name == "HGETALL":
+            return [
+                part for item in self.hashes.get(args[0], {}).items() for part in item
+            ]
+        if name == "EVAL":
+            script, key, owner = args[0], args[2], args[3]
+            holder = self.get(key)
+            if script == ACQUIRE_SCRIPT:
+                if holder is None or holder == owner:
+                    self.set(key, owner, int(args[4]))
+                    return 1
+                return 0
+            if script == RELEASE_SCRIPT:
+                if holder == owner:
+                    return self.run("DEL", [key])
+                return 0
+        raise ValueError(f"ERR unknown command '{name}'")
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    server: RespStandIn
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            try:
+                with self.server.lock:
+                    reply = self.server.run(args[0].upper(), args[1:])
+            except ValueError as e:
+                self.wfile.write(b"-%s\r\n" % str(e).encode("utf-8"))
+                continue
+            self.wfile.write(encode(reply))
+
+    def read_command(self) -> Optional[list[str]]:
+        line = self.rfile.readline()
+        if not line.startswith(b"*"):
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+        return args
+
+
+def encode(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(map(encode, reply))
+    if reply == "OK":
+        return b"+OK\r\n"
+    data = reply.encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
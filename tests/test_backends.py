@@ -0,0 +1,77 @@
+import time
+
+import pytest
+from resp_server import RespStandIn
+
+from app.backends import CacheBackend, RedisBackend, SQLiteBackend
+
+POEMS = [{"id": "a", "title": "A", "edited": "e1"}]
+STANZAS = [{"kind": "verse", "class_name": "poem-verse", "lines": [[["hi", "", ""]]]}]
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        yield SQLiteBackend(str(tmp_path / "store.sqlite3"))
+        return
+    with RespStandIn(password="secret") as server:
+        backend = RedisBackend(server.url, prefix="test:")
+        yield backend
+        backend.client.close()
+
+
+def test_backends_must_implement_every_method():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+def test_catalog_round_trip(backend):
+    assert backend.load_catalog() is None
+    assert backend.catalog_info() is None
+    backend.save_catalog("v1", POEMS)
+    assert backend.load_catalog() == POEMS
+    version, saved_at = backend.catalog_info()
+    assert version == "v1" and saved_at <= time.time()
+
+    time.sleep(0.01)
+    backend.touch_catalog("v1")
+    assert backend.catalog_info()[1] > saved_at
+    # Touching a version that has since been replaced does nothing.
+    backend.touch_catalog("v0")
+    assert backend.catalog_info()[0] == "v1"
+
+
+def test_bodies_are_keyed_by_edit_time(backend):
+    assert backend.load_body("a", "e1") is None
+    backend.save_body("a", "e1", STANZAS)
+    assert backend.load_body("a", "e1") == STANZAS
+    assert backend.load_body("a", "e2") is None
+    backend.save_body("a", "e2", STANZAS)
+    backend.save_body("b", "e1", STANZAS)
+    assert backend.body_versions() == {"a": "e2", "b": "e1"}
+    assert {k: tuple(v) for k, v in backend.load_bodies().items()} == {
+        "a": ("e2", STANZAS),
+        "b": ("e1", STANZAS),
+    }
+
+
+def test_leases(backend):
+    assert backend.acquire_lease("refresh", "one", ttl=30)
+    assert backend.acquire_lease("refresh", "one", ttl=30)
+    assert not backend.acquire_lease("refresh", "two", ttl=30)
+    # Only the holder can release it.
+    backend.release_lease("refresh", "two")
+    assert not backend.acquire_lease("refresh", "two", ttl=30)
+    backend.release_lease("refresh", "one")
+    assert backend.acquire_lease("refresh", "two", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.acquire_lease("refresh", "one", ttl=30)
+
+
+def test_redis_client_reconnects_after_a_dropped_connection():
+    with RespStandIn() as server:
+        backend = RedisBackend(server.url)
+        backend.save_catalog("v1", POEMS)
+        backend.client._sock.close()
+        assert backend.load_catalog() == POEMS
+        backend.client.close()
@@ -0,0 +1,33 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from app.backends import cache_backend
+from app.bodies import SETTLE_SECONDS, body_cache, is_settled, save_body
+
+STANZAS = [{"kind": "verse", "class_name": "poem-verse", "lines": [[["hi", "", ""]]]}]
+
+
+def stamp(seconds_ago: float) -> str:
+    moment = datetime.fromtimestamp(time.time() - seconds_ago, timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+
+def test_is_settled():
+    assert is_settled("2024-01-01T10:00:00.000Z")
+    assert not is_settled(stamp(0))
+    assert is_settled(stamp(0), at=time.time() + SETTLE_SECONDS + 60)
+    # Unparseable edit times can't be reasoned about; trust them.
+    assert is_settled("")
+
+
+def test_bodies_read_within_their_edit_minute_are_not_cached():
+    edited = stamp(0)
+    asyncio.run(save_body("settling", edited, STANZAS))
+    assert not body_cache.contains("settling", edited)
+    assert cache_backend.load_body("settling", edited) is None
+
+    edited = stamp(SETTLE_SECONDS + 60)
+    asyncio.run(save_body("settled", edited, STANZAS))
+    assert body_cache.contains("settled", edited)
+    assert cache_backend.load_body("settled", edited) == STANZAS
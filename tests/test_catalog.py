@@ -0,0 +1,202 @@
+import asyncio
+
+from app import catalog, notion
+from app.backends import SQLiteBackend
+from app.catalog import (
+    REFRESH_LEASE,
+    RETAINED_VERSIONS,
+    CatalogCache,
+    CatalogSnapshot,
+    CatalogSync,
+)
+from app.models import PoemBatch
+
+
+def poem(i: int, excerpt: str = "") -> dict:
+    return {
+        "id": f"p{i}",
+        "title": f"Poem {9 - i}",
+        "date": "",
+        "edited": "e",
+        "image_url": None,
+        "excerpt": excerpt,
+        "content": [],
+    }
+
+
+def test_sort_orders_are_computed_on_first_use():
+    snapshot = CatalogSnapshot.build([poem(i) for i in range(3)])
+    assert snapshot.orders._orders == {}
+    assert snapshot.orders["Recent"] == (2, 1, 0)
+    assert "Title (A-Z)" not in snapshot.orders._orders
+    assert snapshot.orders["Title (A-Z)"] == (2, 1, 0)
+    assert snapshot.orders.get("Best Match") is None
+
+
+def test_cold_load_publishes_partials_only_while_listing():
+    async def loader(previous):
+        yield PoemBatch([poem(0), poem(1)])
+        yield PoemBatch([poem(2)])
+        # Excerpts for poems already listed.
+        yield PoemBatch([poem(0, "first")])
+        yield PoemBatch([poem(1, "second"), poem(2, "third")])
+
+    async def main():
+        cache = CatalogCache()
+        published = []
+        publish = cache._publish
+        cache._publish = lambda snapshot: (
+            published.append(snapshot),
+            publish(snapshot),
+        )
+        await cache.refresh(loader)
+        return published
+
+    published = asyncio.run(main())
+    assert [s.version for s in published[:-1]] == ["partial-2", "partial-3"]
+    complete = published[-1]
+    assert complete.complete
+    assert [p["excerpt"] for p in complete.poems] == ["first", "second", "third"]
+
+
+def test_followers_poll_a_cold_store_right_away(tmp_path):
+    store = SQLiteBackend(str(tmp_path / "store.sqlite3"))
+    # Another worker holds the refresh lease and is still listing.
+    assert store.acquire_lease(REFRESH_LEASE, "leader", ttl=30)
+    poems = [poem(i) for i in range(2)]
+
+    async def loader(previous):
+        raise AssertionError("followers don't call Notion")
+        yield
+
+    async def main():
+        cache = CatalogCache(store=store)
+        task = cache.refresh(loader)
+        await asyncio.sleep(0.2)
+        snapshot = CatalogSnapshot.build(poems)
+        store.save_catalog(snapshot.version, poems)
+        # Well before FOLLOW_INTERVAL_SECONDS.
+        return await asyncio.wait_for(task, timeout=3)
+
+    snapshot = asyncio.run(main())
+    assert [p["id"] for p in snapshot.poems] == ["p0", "p1"]
+
+
+def test_versions_identify_content():
+    poems = [poem(i) for i in range(3)]
+    assert CatalogSnapshot.build(poems).version == CatalogSnapshot.build(poems).version
+    edited = [*poems[:2], {**poems[2], "title": "Renamed"}]
+    assert CatalogSnapshot.build(edited).version != CatalogSnapshot.build(poems).version
+
+
+def test_recent_versions_are_retained_and_the_oldest_evicted():
+    async def main():
+        cache = CatalogCache()
+        snapshots = [
+            CatalogSnapshot.build([poem(i) for i in range(n)])
+            for n in range(1, RETAINED_VERSIONS + 2)
+        ]
+        for snapshot in snapshots:
+            cache._publish(snapshot)
+        return cache, snapshots
+
+    cache, snapshots = asyncio.run(main())
+    assert cache.snapshot is snapshots[-1]
+    assert cache.lookup(snapshots[0].version) is None
+    for snapshot in snapshots[1:]:
+        assert cache.lookup(snapshot.version) is snapshot
+    assert cache.stats()["versions"] == RETAINED_VERSIONS
+
+
+def test_an_unchanged_refresh_keeps_the_snapshot():
+    poems = [poem(i) for i in range(3)]
+
+    async def loader(previous):
+        yield PoemBatch(list(previous or poems))
+
+    async def main():
+        cache = CatalogCache(ttl=0)
+        first = await cache.refresh(loader)
+        second = await cache.refresh(loader)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert second.version == first.version
+    assert second.poems is first.poems
+    assert second.fetched_at >= first.fetched_at
+
+
+def test_the_listing_is_published_complete_before_excerpts(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "DETAILS_PUBLISH_SECONDS", 60)
+    store = SQLiteBackend(str(tmp_path / "store.sqlite3"))
+    saved = []
+
+    async def loader(previous):
+        yield PoemBatch([poem(0), poem(1)])
+        yield PoemBatch([poem(2)], listed=True)
+        saved.append(store.catalog_info()[0])
+        yield PoemBatch([poem(0, "first")])
+        yield PoemBatch([poem(1, "second"), poem(2, "third")])
+
+    async def main():
+        cache = CatalogCache(store=store)
+        published = []
+        publish = cache._publish
+        cache._publish = lambda snapshot: (
+            published.append(snapshot),
+            publish(snapshot),
+        )
+        await cache._refresh_from(loader)
+        return published
+
+    published = asyncio.run(main())
+    assert [s.complete for s in published] == [False, True, True]
+    listing, filled = published[1:]
+    # Saved as soon as the listing was in, before any excerpt.
+    assert saved == [listing.version]
+    assert [p["excerpt"] for p in listing.poems] == ["", "", ""]
+    # Excerpts arriving within DETAILS_PUBLISH_SECONDS land as one new version.
+    assert [p["excerpt"] for p in filled.poems] == ["first", "second", "third"]
+    assert store.catalog_info()[0] == filled.version != listing.version
+
+
+def test_a_deleted_page_is_dropped_by_the_next_full_listing(monkeypatch):
+    edited = "2024-01-01T10:00:00.000Z"
+    live = {"a", "b"}
+    full_listings = []
+
+    async def iter_database_pages(client, database_id, edited_since=None):
+        if edited_since is None:
+            full_listings.append(sorted(live))
+        # Queries never return deleted pages, whether filtered or not.
+        yield [
+            {
+                "id": poem_id,
+                "last_edited_time": edited,
+                "properties": {"Title": {"title": [{"plain_text": poem_id}]}},
+            }
+            for poem_id in sorted(live)
+        ]
+
+    async def list_blocks(client, block_id, page_size=None, priority=None, **kwargs):
+        return {"results": []}
+
+    monkeypatch.setattr(notion, "get_client", lambda: None)
+    monkeypatch.setattr(notion, "iter_database_pages", iter_database_pages)
+    monkeypatch.setattr(notion, "list_blocks", list_blocks)
+
+    async def main():
+        cache = CatalogCache(ttl=0)
+        sync = CatalogSync("db", reconcile_every=2)
+        await cache.refresh(sync)
+        live.discard("b")
+        ids = []
+        for _ in range(sync.reconcile_every + 1):
+            snapshot = await cache.refresh(sync)
+            ids.append([p["id"] for p in snapshot.poems])
+        return ids
+
+    ids = asyncio.run(main())
+    # Incremental refreshes can't see the deletion; the full listing drops it.
+    assert ids == [["a", "b"], ["a", "b"], ["a"]]
+    assert full_listings == [["a", "b"], ["a"]]
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from app import client_search  # noqa: E402
+from app.catalog import CatalogSnapshot  # noqa: E402
+from app.client_search import ClientIndexes  # noqa: E402
+
+POEMS = [
+    {
+        "id": "a",
+        "title": "Morning Light",
+        "date": "",
+        "edited": "e1",
+        "image_url": None,
+        "excerpt": "the sun climbs",
+        "content": [],
+    }
+]
+
+
+def test_a_failed_encode_is_retried(monkeypatch):
+    catalog = CatalogSnapshot.build(POEMS)
+    encode_index = client_search.encode_index
+    calls = []
+
+    def flaky_encode(snapshot):
+        calls.append(snapshot.version)
+        if len(calls) == 1:
+            raise MemoryError("out of memory")
+        return encode_index(snapshot)
+
+    monkeypatch.setattr(client_search, "encode_index", flaky_encode)
+
+    async def main():
+        indexes = ClientIndexes()
+        with pytest.raises(MemoryError):
+            await indexes.get(catalog)
+        encoded = await indexes.get(catalog)
+        # Encoded once it succeeds, and kept from then on.
+        assert await indexes.get(catalog) is encoded
+        return encoded
+
+    data, _ = asyncio.run(main())
+    assert calls == [catalog.version, catalog.version]
+    assert b"Morning Light" in data
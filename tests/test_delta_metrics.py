@@ -0,0 +1,30 @@
+import asyncio
+import uuid
+
+import pytest
+
+pytest.importorskip("reflex")
+
+from app.metrics import delta_bytes  # noqa: E402
+from app.state import PoemContentState, delta_metrics_lifespan  # noqa: E402
+
+
+def test_background_deltas_are_measured(monkeypatch):
+    # Metrics are off by default; the lifespan measures whenever it runs.
+    monkeypatch.setattr(delta_bytes, "_series", {})
+    from app.app import app
+
+    async def main():
+        async with delta_metrics_lifespan(app):
+            # What `async with self` in a background event does on exit.
+            token = f"{uuid.uuid4()}_{PoemContentState.get_full_name()}"
+            async with app.modify_state(token) as state:
+                content = await state.get_state(PoemContentState)
+                content.poem_stanzas = [
+                    {"kind": "verse", "class_name": "", "lines": [[["hi", "", ""]]]}
+                ]
+
+    asyncio.run(main())
+    state = PoemContentState.get_full_name().rpartition(".")[2]
+    counts, total = delta_bytes._series[(state,)]
+    assert sum(counts) == 1 and total > 0
@@ -0,0 +1,157 @@
+import asyncio
+
+from app import notion
+from app.catalog import catalog_version
+
+
+def page(poem_id: str, edited: str = "2024-01-01T10:00:00.000Z") -> dict:
+    return {
+        "id": poem_id,
+        "last_edited_time": edited,
+        "properties": {"Title": {"title": [{"plain_text": poem_id.title()}]}},
+    }
+
+
+def paragraph(text: str) -> dict:
+    return {"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": text}]}}
+
+
+def collect(stream) -> list:
+    async def main():
+        return [batch async for batch in stream]
+
+    return asyncio.run(main())
+
+
+def test_failed_excerpts_are_left_empty_and_read_again(monkeypatch):
+    pages = [page("a"), page("b")]
+    failing = {"a"}
+    reads = []
+
+    async def iter_database_pages(client, database_id, edited_since=None):
+        yield pages
+
+    async def list_blocks(client, block_id, page_size=None, priority=None, **kwargs):
+        reads.append(block_id)
+        if block_id in failing:
+            raise RuntimeError("timed out")
+        return {"results": [paragraph(f"{block_id} begins")]}
+
+    monkeypatch.setattr(notion, "get_client", lambda: None)
+    monkeypatch.setattr(notion, "iter_database_pages", iter_database_pages)
+    monkeypatch.setattr(notion, "list_blocks", list_blocks)
+
+    batches = collect(notion.stream_poems("db"))
+    first = {p["id"]: p for batch in batches for p in batch.poems}
+    assert first["a"]["excerpt"] == ""
+    assert first["b"]["excerpt"] == "b begins..."
+
+    # The next full listing retries only the poem whose read failed.
+    failing.clear()
+    reads.clear()
+    batches = collect(notion.stream_poems("db", list(first.values())))
+    second = {p["id"]: p for batch in batches for p in batch.poems}
+    assert reads == ["a"]
+    assert second["a"]["excerpt"] == "a begins..."
+    assert second["b"]["excerpt"] == "b begins..."
+
+
+def test_changes_in_the_newest_minute_are_always_read_again(monkeypatch):
+    old_minute, new_minute = "2024-01-01T09:00:00.000Z", "2024-01-01T10:00:00.000Z"
+    previous = [
+        {**notion.parse_page(page("a", old_minute)), "excerpt": "a..."},
+        {**notion.parse_page(page("b", new_minute)), "excerpt": "b..."},
+    ]
+    queried = []
+
+    async def iter_database_pages(client, database_id, edited_since=None):
+        queried.append(edited_since)
+        # The query is inclusive, and "b" was edited again within its minute.
+        yield [page("b", new_minute), page("c", new_minute)]
+
+    async def list_blocks(client, block_id, page_size=None, priority=None, **kwargs):
+        return {"results": [paragraph(f"{block_id} again")]}
+
+    monkeypatch.setattr(notion, "get_client", lambda: None)
+    monkeypatch.setattr(notion, "iter_database_pages", iter_database_pages)
+    monkeypatch.setattr(notion, "list_blocks", list_blocks)
+
+    batches = collect(notion.stream_changes("db", previous))
+    assert queried == [new_minute]
+    assert [p["excerpt"] for batch in batches for p in batch.poems] == [
+        "b again...",
+        "c again...",
+    ]
+
+
+def test_a_failed_read_again_keeps_the_catalog_version(monkeypatch):
+    minute = "2024-01-01T10:00:00.000Z"
+    previous = [{**notion.parse_page(page("a", minute)), "excerpt": "a..."}]
+
+    async def iter_database_pages(client, database_id, edited_since=None):
+        yield [page("a", minute)]
+
+    async def list_blocks(client, block_id, page_size=None, priority=None, **kwargs):
+        raise RuntimeError("timed out")
+
+    monkeypatch.setattr(notion, "get_client", lambda: None)
+    monkeypatch.setattr(notion, "iter_database_pages", iter_database_pages)
+    monkeypatch.setattr(notion, "list_blocks", list_blocks)
+
+    batches = collect(notion.stream_changes("db", previous))
+    assert [batch.poems for batch in batches] == [previous]
+    assert catalog_version(batches[0].poems) == catalog_version(previous)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = notion.SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"results": []}
+
+    async def main():
+        results = await asyncio.gather(*[flight.do("page", fetch) for _ in range(3)])
+        # Finished calls are forgotten, so a later one reads again.
+        await flight.do("page", fetch)
+        return results
+
+    results = asyncio.run(main())
+    assert results == [{"results": []}] * 3
+    assert len(calls) == 2
+    assert flight.stats() == {"started": 2, "coalesced": 2, "in_flight": 0}
+
+
+def test_single_flight_survives_a_caller_going_away():
+    flight = notion.SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "body"
+
+    async def main():
+        leaving = asyncio.ensure_future(flight.do("page", fetch))
+        staying = asyncio.ensure_future(flight.do("page", fetch))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        return await staying
+
+    assert asyncio.run(main()) == "body"
+
+
+def test_single_flight_shares_errors():
+    flight = notion.SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("gone")
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("page", fetch), flight.do("page", fetch), return_exceptions=True
+        )
+
+    errors = asyncio.run(main())
+    assert [str(e) for e in errors] == ["gone", "gone"]
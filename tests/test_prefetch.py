@@ -0,0 +1,30 @@
+import asyncio
+
+from app import prefetch
+from app.bodies import body_cache, get_body, has_body
+from app.prefetch import Prefetcher
+from app.scheduler import Priority
+
+STANZAS = [{"kind": "verse", "class_name": "poem-verse", "lines": [[["hi", "", ""]]]}]
+POEM = {"id": "prefetched", "title": "T", "date": "", "edited": "e1"}
+
+
+def test_prefetched_bodies_skip_the_memory_cache(monkeypatch):
+    async def fetch_poem_body(poem_id, priority):
+        return STANZAS
+
+    monkeypatch.setattr(prefetch, "fetch_poem_body", fetch_poem_body)
+
+    async def main():
+        prefetcher = Prefetcher()
+        await prefetcher._fetch(POEM, Priority.PREFETCH, check_saved=True)
+        in_memory = body_cache.contains(POEM["id"], POEM["edited"])
+        stored = await has_body(POEM["id"], POEM["edited"])
+        # A reader opening it loads it from the store into memory.
+        body = await get_body(POEM["id"], POEM["edited"])
+        return prefetcher.fetched, in_memory, stored, body
+
+    fetched, in_memory, stored, body = asyncio.run(main())
+    assert (fetched, in_memory, stored) == (1, False, True)
+    assert list(body) == STANZAS
+    assert body_cache.contains(POEM["id"], POEM["edited"])
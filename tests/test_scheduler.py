@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+
+from app.notion import SingleFlight
+from app.scheduler import Lane, NotionScheduler, Priority, retry_delay
+
+
+class StatusError(Exception):
+    def __init__(self, status: int, headers: dict = None):
+        self.status = status
+        self.headers = headers or {}
+
+
+def test_retry_delay_honours_retry_after():
+    delay = retry_delay(StatusError(429, {"retry-after": "2"}), 0)
+    assert 2 <= delay <= 2.5
+
+
+def test_retry_delay_gives_up_on_client_errors():
+    assert retry_delay(StatusError(404), 0) is None
+    assert retry_delay(ValueError("bad"), 0) is None
+
+
+def test_retry_delay_retries_server_and_transport_errors():
+    assert retry_delay(StatusError(502), 3) is not None
+    assert retry_delay(httpx.ConnectError("down"), 0) is not None
+
+
+def test_run_retries_transient_errors_then_succeeds(monkeypatch):
+    monkeypatch.setattr("app.scheduler.retry_delay", lambda error, attempt: 0)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise StatusError(503)
+        return "ok"
+
+    async def main():
+        scheduler = NotionScheduler(rate=1000, burst=10, max_concurrency=2)
+        return await scheduler.run(flaky), scheduler.retries
+
+    assert asyncio.run(main()) == ("ok", 2)
+
+
+def test_run_stops_after_max_retries(monkeypatch):
+    monkeypatch.setattr("app.scheduler.retry_delay", lambda error, attempt: 0)
+
+    async def failing():
+        raise StatusError(503)
+
+    async def main():
+        scheduler = NotionScheduler(rate=1000, burst=10, max_retries=2)
+        try:
+            await scheduler.run(failing)
+        except StatusError:
+            return scheduler.retries
+
+    assert asyncio.run(main()) == 2
+
+
+def test_waiting_calls_run_by_priority():
+    order = []
+
+    async def call(name):
+        order.append(name)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        scheduler = NotionScheduler(rate=1000, burst=10, max_concurrency=1)
+        await asyncio.gather(
+            scheduler.run(lambda: call("prefetch"), Priority.PREFETCH),
+            scheduler.run(lambda: call("excerpt"), Priority.EXCERPT),
+            scheduler.run(lambda: call("interactive"), Priority.INTERACTIVE),
+        )
+
+    asyncio.run(main())
+    assert order == ["interactive", "excerpt", "prefetch"]
+
+
+def test_joining_a_queued_call_raises_its_lane():
+    order = []
+    flight = SingleFlight()
+
+    async def call(name):
+        order.append(name)
+        await asyncio.sleep(0.01)
+        return name
+
+    async def main():
+        scheduler = NotionScheduler(rate=1000, burst=10, max_concurrency=1)
+
+        def shared(priority):
+            lane = Lane(priority)
+            return flight.do(
+                "blocks:x", lambda: scheduler.run(lambda: call("body"), lane), lane
+            )
+
+        excerpts = [
+            asyncio.create_task(
+                scheduler.run(lambda i=i: call(f"excerpt{i}"), Priority.EXCERPT)
+            )
+            for i in range(5)
+        ]
+        prefetch = asyncio.create_task(shared(Priority.PREFETCH))
+        await asyncio.sleep(0)
+        interactive = await shared(Priority.INTERACTIVE)
+        await asyncio.gather(*excerpts, prefetch)
+        return interactive
+
+    assert asyncio.run(main()) == "body"
+    # At most the excerpt already holding the slot ran before it.
+    assert order.index("body") <= 1
+    assert order.count("body") == 1
+    assert flight.stats()["coalesced"] == 1
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from app import search
+from app.search import SearchIndex, SearchIndexes
+
+
+def poem(poem_id, title, excerpt=""):
+    return {"id": poem_id, "title": title, "excerpt": excerpt, "edited": "e1"}
+
+
+POEMS = [
+    poem("a", "Morning Light", "the sun climbs"),
+    poem("b", "Evening", "a morning remembered"),
+    poem("c", "Café Noir", "bitter and warm"),
+]
+
+
+def test_search_ranks_titles_and_matches_prefixes():
+    index = SearchIndex("v1", POEMS)
+    assert index.search("morning") == ["a", "b"]
+    assert index.search("morn") == ["a", "b"]
+    assert index.search("cafe") == ["c"]
+    assert index.search("morning sun") == ["a"]
+    assert index.search("nothing") == []
+
+
+def test_add_content_changes_results_and_generation():
+    index = SearchIndex("v1", POEMS)
+    generation = index.generation
+    assert index.search("lantern") == []
+    index.add_content("c", ["a lantern in the rain"])
+    assert index.search("lantern") == ["c"]
+    assert index.generation != generation
+    # Unknown poems are ignored.
+    index.add_content("missing", ["lantern"])
+    assert index.search("lantern") == ["c"]
+
+
+def test_indexes_are_kept_per_version(monkeypatch):
+    builds = []
+
+    def build_index(version, poems):
+        builds.append(version)
+        return SearchIndex(version, poems)
+
+    monkeypatch.setattr(search, "build_index", build_index)
+
+    async def main():
+        indexes = SearchIndexes(retained=2)
+        assert indexes.get("v1", POEMS) is None
+        await asyncio.sleep(0.05)
+        # A newer version is served the older index until its own is built.
+        assert indexes.get("v2", POEMS[:2]).version == "v1"
+        await asyncio.sleep(0.05)
+        # Sessions on either version no longer trigger rebuilds.
+        for _ in range(3):
+            assert indexes.get("v1", POEMS).version == "v1"
+            assert indexes.get("v2", POEMS[:2]).version == "v2"
+        indexes.get("v3", POEMS)
+        await asyncio.sleep(0.05)
+        return indexes
+
+    indexes = asyncio.run(main())
+    assert builds == ["v1", "v2", "v3"]
+    # The least recently used index is evicted.
+    assert list(indexes._indexes) == ["v2", "v3"]
+
+
+def test_older_build_finishing_last_does_not_replace_newer(monkeypatch):
+    def build_index(version, poems):
+        if version == "old":
+            # Slower than the newer version's build.
+            time.sleep(0.1)
+        return SearchIndex(version, poems)
+
+    monkeypatch.setattr(search, "build_index", build_index)
+
+    async def main():
+        indexes = SearchIndexes(retained=1)
+        indexes.get("old", POEMS)
+        indexes.get("new", POEMS)
+        await asyncio.sleep(0.3)
+        return indexes
+
+    indexes = asyncio.run(main())
+    assert list(indexes._indexes) == ["new"]
+    assert indexes._newest().version == "new"
+    assert not indexes._builds
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("reflex")
+
+from reflex.state import State  # noqa: E402
+
+from app.catalog import CatalogSnapshot, catalog_cache  # noqa: E402
+from app import state as state_module  # noqa: E402
+from app.search import SearchIndexes  # noqa: E402
+from app.state import PoetryState  # noqa: E402
+
+
+def poem(i: int) -> dict:
+    return {
+        "id": f"state-{i}",
+        "title": f"Poem {i}",
+        "date": f"2020-01-{i + 1:02d}",
+        "edited": "e",
+        "image_url": None,
+        "excerpt": "",
+        "content": [],
+    }
+
+
+def session() -> PoetryState:
+    root = State(_reflex_internal_init=True)
+    return root.get_substate(PoetryState.get_full_name().split(".")[1:])
+
+
+def test_unknown_catalog_version_falls_back_to_the_newest(monkeypatch):
+    snapshot = CatalogSnapshot.build([poem(i) for i in range(3)])
+    monkeypatch.setattr(catalog_cache, "_snapshot", snapshot)
+    monkeypatch.setattr(catalog_cache, "_versions", {snapshot.version: snapshot})
+    state = session()
+    # E.g. evicted after RETAINED_VERSIONS refreshes, or built by another worker.
+    state.catalog_version = "evicted"
+    state.is_loading = False
+    assert state.total_poem_count == 3
+    assert state.filtered_count == 3
+    state.selected_poem_id = "state-1"
+    assert state.prev_poem[0] == "state-2"
+    assert state.next_poem[0] == "state-0"
+
+    async def search():
+        state.set_search_term("Poem")
+
+    asyncio.run(search())
+    assert state.catalog_version == snapshot.version
+
+
+def test_sessions_follow_the_index_as_it_changes(monkeypatch):
+    snapshot = CatalogSnapshot.build([poem(i) for i in range(3)])
+    monkeypatch.setattr(catalog_cache, "_snapshot", snapshot)
+    monkeypatch.setattr(catalog_cache, "_versions", {snapshot.version: snapshot})
+    indexes = SearchIndexes()
+    monkeypatch.setattr(state_module, "search_indexes", indexes)
+
+    async def main():
+        state = session()
+        state._apply_catalog(snapshot)
+        # Typed before the index exists: the substring scan finds nothing.
+        state.set_search_term("lantern")
+        assert state.search_generation == 0
+        assert state.filtered_count == 0
+        while indexes._builds:
+            await asyncio.sleep(0.01)
+        woken = asyncio.ensure_future(indexes.wait_for_update())
+        # A body read later matches; the index changes, the session hasn't yet.
+        indexes.add_content("state-1", ["a lantern in the rain"])
+        await asyncio.sleep(0)
+        assert woken.done()
+        assert state.filtered_count == 0
+        # What watch_search_index does once woken.
+        state._sync_search_index()
+        assert state.search_generation != 0
+        assert state.filtered_count == 1
+        assert state.filtered_poems[0][0] == "state-1"
+        assert state.collection_stats == "Showing 1 of 3 poems"
+
+    asyncio.run(main())
+
+
+def test_best_match_needs_a_search_term(monkeypatch):
+    snapshot = CatalogSnapshot.build([poem(i) for i in range(3)])
+    monkeypatch.setattr(catalog_cache, "_snapshot", snapshot)
+    monkeypatch.setattr(catalog_cache, "_versions", {snapshot.version: snapshot})
+    monkeypatch.setattr(state_module, "search_indexes", SearchIndexes())
+    state = session()
+    state.catalog_version = snapshot.version
+    state.is_loading = False
+
+    async def main():
+        state.set_sort_by("Best Match")
+        assert state.sort_by == "Recent"
+        state.set_search_term("Poem")
+        state.set_sort_by("Best Match")
+        assert state.sort_by == "Best Match"
+        assert state.collection_stats == "Showing 3 of 3 poems"
+        state.set_search_term("")
+        assert state.sort_by == "Recent"
+        assert state.collection_stats == "3 poems in collection"
+
+    asyncio.run(main())